@@ -0,0 +1,146 @@
+import threading
+from pathlib import Path
+from renamer import parse_new_filename
+
+FIELDS = ("prefix", "city", "description")  # Change entry fields that get suggestions
+TOP_K = 6  # Suggestions cached per trie node; one more than shown, since the typed text itself is left out
+SHOWN = 5
+BUCKET_SIZE = 32  # A leaf holds up to this many keys before it's split into child nodes
+
+
+class _Node:
+    __slots__ = ("children", "bucket", "key", "top")
+
+    def __init__(self):
+        self.children = None  # Next character -> _Node, once the node has been split
+        self.bucket = set()  # Keys below a leaf, filtered on lookup
+        self.key = None  # Key ending exactly at a split node
+        self.top = None  # Up to TOP_K keys below a split node, most frequent first
+
+
+class Trie:
+    """Prefix trie ranking its keys by how often they were added.
+
+    Nodes are split lazily (a burst trie): a leaf keeps a small set of keys and is only turned into child
+    nodes when it grows past BUCKET_SIZE, so 100k names need a few thousand nodes rather than millions.
+    Split nodes cache their TOP_K most frequent keys, so a lookup is a walk down the typed prefix plus, at
+    worst, sorting one small bucket. Counts only go up, which keeps the cached rankings easy to maintain.
+    """
+
+    def __init__(self):
+        self.root = _Node()
+        self.counts = {}  # Key (casefolded text) -> count
+        self.texts = {}  # Key -> text as first typed
+
+    def rank(self, keys):
+        return sorted(keys, key=lambda key: (-self.counts[key], key))
+
+    def add(self, text, count=1):
+        text = text.strip()
+        if not text:
+            return
+        key = text.casefold()
+        self.texts.setdefault(key, text)
+        self.counts[key] = self.counts.get(key, 0) + count
+        node, depth = self.root, 0
+        while node.children is not None:
+            self.promote(node, key)
+            if depth == len(key):
+                node.key = key
+                return
+            child = node.children.get(key[depth])
+            if child is None:
+                child = node.children[key[depth]] = _Node()
+            node, depth = child, depth + 1
+        node.bucket.add(key)
+        if len(node.bucket) > BUCKET_SIZE:
+            self.split(node, depth)
+
+    def promote(self, node, key):
+        """Update a split node's cached ranking after key's count went up: it can only move towards the front."""
+        top, counts = node.top, self.counts
+        count = counts[key]
+        if key in top:
+            i = top.index(key)
+        elif len(top) < TOP_K:
+            i = len(top)
+            top.append(key)
+        else:
+            last = top[-1]
+            if count < counts[last] or (count == counts[last] and key > last):
+                return  # The common case: nowhere near the top
+            i = len(top) - 1
+            top[i] = key
+        while i and (count > counts[top[i - 1]] or (count == counts[top[i - 1]] and key < top[i - 1])):
+            top[i] = top[i - 1]
+            i -= 1
+        top[i] = key
+
+    def split(self, node, depth):
+        node.top = self.rank(node.bucket)[:TOP_K]
+        node.children = {}
+        for key in node.bucket:
+            if len(key) == depth:
+                node.key = key
+            else:
+                node.children.setdefault(key[depth], _Node()).bucket.add(key)
+        node.bucket = None
+        for child in node.children.values():
+            if len(child.bucket) > BUCKET_SIZE:  # All keys may share the next character too
+                self.split(child, depth + 1)
+
+    def suggest(self, typed, limit=SHOWN):
+        """Return up to limit known texts starting with typed (case-insensitive), most frequent first."""
+        prefix = typed.strip().casefold()
+        if not prefix:
+            return []
+        node, depth = self.root, 0
+        while node.children is not None and depth < len(prefix):
+            node = node.children.get(prefix[depth])
+            if node is None:
+                return []
+            depth += 1
+        if node.children is not None:
+            keys = node.top
+        else:
+            keys = self.rank(key for key in node.bucket if key.startswith(prefix))[:TOP_K]
+        return [self.texts[key] for key in keys if key != prefix][:limit]
+
+
+class Autocomplete:
+    """Suggestions for the prefix, city and description fields, learned from existing names and from edits."""
+
+    def __init__(self):
+        self.tries = {field: Trie() for field in FIELDS}
+        self.recorded = {}  # File -> {field: value} as last recorded, so revisiting an image doesn't count twice
+        self.lock = threading.Lock()  # Seeding runs on a background thread while the viewer asks for suggestions
+
+    def add(self, field, text, count=1):
+        with self.lock:
+            self.tries[field].add(text, count)
+
+    def suggest(self, field, typed, limit=SHOWN):
+        with self.lock:
+            return self.tries[field].suggest(typed, limit)
+
+    def record(self, file, entry):
+        """Learn the fields of a committed change entry; only values that changed since last time are counted."""
+        if entry.get("delete"):
+            return
+        with self.lock:  # recorded and the tries are shared with the seeding thread
+            recorded = self.recorded.setdefault(file, {})
+            for field in FIELDS:
+                value = (entry.get(field) or "").strip()
+                if value and recorded.get(field) != value:
+                    self.tries[field].add(value)
+                    recorded[field] = value
+
+    def add_filenames(self, paths):
+        """Seed descriptions from files already named "YYYY MM DD <description>". Returns how many matched."""
+        matched = 0
+        for path in paths:
+            parsed = parse_new_filename(Path(path).stem)
+            if parsed:  # Like the viewer, everything after the date counts as the description
+                self.add("description", parsed[1])
+                matched += 1
+        return matched
@@ -0,0 +1,86 @@
+import argparse
+import io
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+import piexif
+from PIL import Image, ImageDraw
+
+# Photos are taken around a few places, so geocoding sees realistic clusters of nearby points
+PLACES = [(48.8566, 2.3522), (40.7128, -74.0060), (35.6762, 139.6503), (-33.8688, 151.2093), (51.5074, -0.1278)]
+EXIF_THUMBNAIL_SIZE = (160, 120)
+
+
+def to_rational_dms(value):
+    """Decimal degrees -> EXIF ((deg, 1), (min, 1), (sec * 100, 100))."""
+    value = abs(value)
+    degrees = int(value)
+    minutes = int((value - degrees) * 60)
+    seconds = round((value - degrees - minutes / 60) * 3600 * 100)
+    return ((degrees, 1), (minutes, 1), (seconds, 100))
+
+
+def make_image(rng, size):
+    image = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):  # Some shapes, so images differ and compress like photos rather than flat colour
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        x1, y1 = x0 + rng.randrange(size[0] // 2), y0 + rng.randrange(size[1] // 2)
+        draw.ellipse((x0, y0, x1, y1), fill=tuple(rng.randrange(256) for _ in range(3)))
+    return image
+
+
+def make_exif(rng, date, gps, orientation, image):
+    thumbnail = image.copy()
+    thumbnail.thumbnail(EXIF_THUMBNAIL_SIZE)
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, "JPEG", quality=75)
+    exif = {
+        "0th": {piexif.ImageIFD.Orientation: orientation, piexif.ImageIFD.Make: b"Synthetic"},
+        "Exif": {piexif.ExifIFD.DateTimeOriginal: date.strftime("%Y:%m:%d %H:%M:%S").encode()},
+        "1st": {piexif.ImageIFD.JPEGInterchangeFormat: 0, piexif.ImageIFD.JPEGInterchangeFormatLength: 0},
+        "thumbnail": buffer.getvalue(),
+    }
+    if gps:
+        lat, lon = gps
+        exif["GPS"] = {
+            piexif.GPSIFD.GPSLatitudeRef: b"N" if lat >= 0 else b"S",
+            piexif.GPSIFD.GPSLatitude: to_rational_dms(lat),
+            piexif.GPSIFD.GPSLongitudeRef: b"E" if lon >= 0 else b"W",
+            piexif.GPSIFD.GPSLongitude: to_rational_dms(lon),
+        }
+    return piexif.dump(exif)
+
+
+def make_corpus(folder, count=200, size=(2000, 1500), gps_fraction=0.8, rotated_fraction=0.1, seed=1, quality=85):
+    """Write count JPEGs named IMG_00000.jpg... to folder and return their paths. The same seed gives the same corpus."""
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    start = datetime(2024, 6, 1, 9, 0, 0)
+    paths = []
+    for i in range(count):
+        image = make_image(rng, size)
+        date = start + timedelta(minutes=17 * i)
+        gps = None
+        if rng.random() < gps_fraction:
+            lat, lon = rng.choice(PLACES)
+            gps = (lat + rng.uniform(-0.05, 0.05), lon + rng.uniform(-0.05, 0.05))
+        orientation = 6 if rng.random() < rotated_fraction else 1
+        path = folder / f"IMG_{i:05}.jpg"
+        image.save(path, "JPEG", quality=quality, exif=make_exif(rng, date, gps, orientation, image))
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic JPEGs with EXIF dates and GPS for benchmarking.")
+    parser.add_argument("folder", help="Folder to write the images to.")
+    parser.add_argument("--count", type=int, default=200, help="Number of images.")
+    parser.add_argument("--size", default="2000x1500", help="Resolution as WIDTHxHEIGHT.")
+    parser.add_argument("--gps", type=float, default=0.8, help="Fraction of images with GPS coordinates.")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed; the same seed gives the same corpus.")
+    args = parser.parse_args()
+    width, height = (int(part) for part in args.size.lower().split("x"))
+    paths = make_corpus(args.folder, args.count, (width, height), args.gps, seed=args.seed)
+    print(f"Wrote {len(paths)} images to {args.folder}")
@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # No window; runs on CI machines and over SSH
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pygame
+import geolocator
+from autocomplete import Autocomplete
+from changes import ChangeEntry
+from display import DisplaySession
+from exif_reader import read_metadata
+from headless import parse_rule, rename_by_rule
+from image_cache import image_cache
+from image_viewer import ImageViewer
+from main import AutoImageRenamer
+from metadata_index import MetadataIndex
+from planner import plan_renames
+from prescan import prescan
+from scanner import ImageMatcher, scan_images
+from make_corpus import make_corpus
+
+RESULTS_FILE = Path(__file__).resolve().parent / "results.jsonl"
+REGRESSION_RATIO = 1.25  # Slower than the previous run by more than this is flagged
+REGRESSION_MIN_SECONDS = 0.01  # ...unless the difference is within run-to-run noise
+KEYSTROKES = 200
+AUTOCOMPLETE_NAMES = 100000
+WORDS = ("beach", "walk", "sunset", "birthday", "party", "mountain", "hike", "dinner", "family", "tour", "lake", "snow")
+
+
+class StubNominatim(BaseHTTPRequestHandler):
+    """Answers /reverse like Nominatim, after a fixed delay standing in for the network."""
+    latency = 0.02
+    requests = 0
+
+    def do_GET(self):
+        StubNominatim.requests += 1
+        time.sleep(self.latency)
+        query = parse_qs(urlparse(self.path).query)
+        lat, lon = float(query["lat"][0]), float(query["lon"][0])
+        city = f"City {round(lat)} {round(lon)}"
+        body = json.dumps({"lat": str(lat), "lon": str(lon), "display_name": city, "address": {"city": city}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep the benchmark output readable
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[int(fraction * (len(values) - 1))] if values else 0.0
+
+
+def bench_scan(folder, results):
+    matcher = ImageMatcher("*", False)
+    results["scan.cold_s"] = timed(lambda: list(scan_images(folder, matcher, False)))
+    results["scan.warm_s"] = timed(lambda: list(scan_images(folder, matcher, False)))
+
+
+def bench_exif(folder, images, results):
+    results["exif.parse_s"] = timed(lambda: [read_metadata(path) for path in images])  # Header parse only, no index
+    index = MetadataIndex(folder)
+    with open(os.devnull, "w") as quiet:
+        results["exif.cold_index_s"] = timed(prescan, images, index, out=quiet)
+    index.close()
+
+    def warm():
+        warm_index = MetadataIndex(folder)  # Opening the index loads every row; no image is read
+        for path in images:
+            warm_index.load(path)
+        warm_index.close()
+    results["exif.warm_index_s"] = timed(warm)
+
+
+def bench_geocode(folder, images, results, work):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubNominatim)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    options = {"domain": f"127.0.0.1:{server.server_address[1]}", "scheme": "http"}
+    points = [metadata.gps for metadata in (read_metadata(path) for path in images) if metadata.gps]
+    cache_path = work / "geocode_cache.json"
+    try:
+        geolocator.configure(online=True, cache_path=cache_path, nominatim_options=options)
+        results["geocode.cold_s"] = timed(geolocator.locate_many, points)
+        results["geocode.requests"] = StubNominatim.requests
+        geolocator.cache.save()
+        geolocator.configure(online=True, cache_path=cache_path, nominatim_options=options)  # Reloads the saved cache
+        results["geocode.warm_s"] = timed(geolocator.locate_many, points)
+    finally:
+        server.shutdown()
+        geolocator.configure(online=False, cache_path=cache_path)  # The rest of the run stays offline
+
+
+def bench_viewer(folder, images, results, samples):
+    display = DisplaySession()
+    index = MetadataIndex(folder)
+    image_cache.clear()
+    cold, warm = [], []
+    for path in images[:samples]:
+        viewer = ImageViewer(path, ChangeEntry(path.name), display=display, index=index)
+        viewer.screen = display.screen
+        cold.append(timed(viewer.show_image))  # Decode, scale and full redraw
+        display.overlay.invalidate()
+        warm.append(timed(viewer.show_image))  # Cached surface, full redraw
+    results["first_paint.cold_mean_s"] = sum(cold) / len(cold)
+    results["first_paint.cold_p95_s"] = percentile(cold, 0.95)
+    results["first_paint.warm_mean_s"] = sum(warm) / len(warm)
+
+    keystrokes = []
+    for i in range(KEYSTROKES):
+        character = "abcdefghij "[i % 11]
+        event = pygame.event.Event(pygame.KEYDOWN, key=ord(character), unicode=character, mod=0)
+        keystrokes.append(timed(lambda: (viewer.handle_event(event), viewer.show_image())))
+    results["keystroke.mean_s"] = sum(keystrokes) / len(keystrokes)
+    results["keystroke.p95_s"] = percentile(keystrokes, 0.95)
+
+    def key(key, character=""):
+        event = pygame.event.Event(pygame.KEYDOWN, key=key, unicode=character, mod=0)
+        return timed(lambda: (viewer.handle_event(event), viewer.show_image()))
+    results["zoom.enter_s"] = key(pygame.K_F7)  # Full resolution decode plus the visible tiles
+    pans = [key(pygame.K_RIGHT) for _ in range(KEYSTROKES // 4)] + [key(pygame.K_LEFT) for _ in range(KEYSTROKES // 4)]
+    results["zoom.pan_mean_s"] = sum(pans) / len(pans)
+    results["zoom.pan_p95_s"] = percentile(pans, 0.95)
+    results["zoom.out_s"] = key(pygame.K_MINUS, "-")  # Next level reduced from the one in memory
+    key(pygame.K_F7)
+    index.close()
+    display.close()
+
+
+def bench_autocomplete(results):
+    names = [f"2024 01 {10 + i % 19} {WORDS[i % 12]} {WORDS[i * 7 % 11]} {i % 97}.jpg" for i in range(AUTOCOMPLETE_NAMES)]
+    autocomplete = Autocomplete()
+    results["autocomplete.seed_s"] = timed(autocomplete.add_filenames, names)
+    typed = [name[11:11 + length] for name in names[:KEYSTROKES // 10] for length in range(1, 11)]
+    lookups = [timed(autocomplete.suggest, "description", text) for text in typed]
+    results["autocomplete.suggest_mean_s"] = sum(lookups) / len(lookups)
+    results["autocomplete.suggest_p95_s"] = percentile(lookups, 0.95)
+
+
+def bench_batch(folder, results):
+    rule = parse_rule("date,city,prefix=Bench")
+    app = AutoImageRenamer(folder, headless=rule)  # Rule-named photos are renamed without a description
+    app.wait_for_scan()
+    with open(os.devnull, "w") as quiet:
+        rename_by_rule(app.images, app.changes, app.index, rule, out=quiet)
+    assert plan_renames(app.changes, app.folder, require_description=False).moves, "benchmark batch is empty"
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")  # generate_batch_file prints every conflict
+    try:
+        results["batch.cold_s"] = timed(app.generate_batch_file)
+        results["batch.warm_s"] = timed(app.generate_batch_file)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    app.index.close()
+
+
+def previous_run(path, corpus):
+    """Return the last recorded run over the same kind of corpus, if any."""
+    if not path.exists():
+        return None
+    previous = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                run = json.loads(line)
+            except ValueError:
+                continue
+            if run.get("corpus") == corpus:
+                previous = run
+    return previous
+
+
+def report(results, previous):
+    regressions = []
+    print(f"{'metric':28} {'value':>12} {'previous':>12} {'change':>8}")
+    for name, value in results.items():
+        old = previous["metrics"].get(name) if previous else None
+        line = f"{name:28} {value:12.4f}"
+        if old:
+            line += f" {old:12.4f} {100 * (value - old) / old:+7.1f}%"
+            if name.endswith("_s") and value > old * REGRESSION_RATIO and value - old > REGRESSION_MIN_SECONDS:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scanning, EXIF, geocoding, drawing, zooming, autocomplete and batch generation.")
+    parser.add_argument("--count", type=int, default=200, help="Number of synthetic images.")
+    parser.add_argument("--size", default="2000x1500", help="Image resolution as WIDTHxHEIGHT.")
+    parser.add_argument("--samples", type=int, default=10, help="Images to measure first paint on.")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds the stub geocoder waits per request.")
+    parser.add_argument("--results", default=str(RESULTS_FILE), help="JSON lines file the results are appended to.")
+    parser.add_argument("--no-record", action="store_true", help="Compare with earlier runs but don't record this one.")
+    args = parser.parse_args()
+
+    width, height = (int(part) for part in args.size.lower().split("x"))
+    corpus = {"count": args.count, "size": [width, height], "latency": args.latency}
+    StubNominatim.latency = args.latency
+    work = Path(tempfile.mkdtemp(prefix="image_renamer_bench_"))
+    folder = work / "photos"
+    try:
+        start = time.perf_counter()
+        images = make_corpus(folder, args.count, (width, height))
+        print(f"Generated {len(images)} images in {time.perf_counter() - start:.1f}s")
+        results = {}
+        bench_scan(folder, results)
+        bench_exif(folder, images, results)
+        bench_geocode(folder, images, results, work)
+        bench_viewer(folder, images, results, args.samples)
+        bench_autocomplete(results)
+        bench_batch(folder, results)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    results_path = Path(args.results)
+    regressions = report(results, previous_run(results_path, corpus))
+    if not args.no_record:
+        run = {"time": datetime.now().isoformat(timespec="seconds"), "commit": git_commit(),
+               "python": platform.python_version(), "machine": platform.node(), "corpus": corpus, "metrics": results}
+        with open(results_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run) + "\n")
+        print(f"Results appended to {results_path}")
+    if regressions:
+        print(f"Slower than the previous run: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+_MISSING = object()
+
+
+class ChangeEntry:
+    """Pending change for one image, stored in slots instead of a dict to keep large sessions compact.
+
+    Supports the dictionary-style access (entry["proposed"], entry.get("prefix", default)) the viewer uses;
+    fields that were never set behave like missing keys.
+    """
+    __slots__ = ("original", "folder", "proposed", "delete", "description", "prefix", "city", "postfix", "date",
+                 "include_location", "use_prefix", "show_date", "location_edited")
+
+    def __init__(self, original, folder=""):
+        self.original = original  # Filename, without the folder
+        self.folder = folder  # Folder relative to the scanned root, "" for the root itself
+        self.proposed = original
+        self.delete = False
+        self.description = ""
+
+    def __getitem__(self, key):
+        value = getattr(self, key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        try:
+            setattr(self, key, value)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        return getattr(self, key, _MISSING) is not _MISSING
+
+    def get(self, key, default=None):
+        value = getattr(self, key, _MISSING)
+        return default if value is _MISSING else value
+
+    def items(self):
+        """Yield (field, value) for every field that has been set."""
+        for key in self.__slots__:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                yield key, value
+
+    @property
+    def relative_path(self):
+        """Path of the original file relative to the scanned root, with forward slashes."""
+        return f"{self.folder}/{self.original}" if self.folder else self.original
+
+    def __repr__(self):
+        return f"ChangeEntry({dict(self.items())!r})"
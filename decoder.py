@@ -0,0 +1,64 @@
+import io
+import pygame
+import piexif
+from PIL import Image
+from exif_reader import get_metadata, read_header
+from profiler import profiler
+
+# EXIF orientation -> transpose that turns the stored pixels upright (same table as PIL's exif_transpose)
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+def orient(pil_image, orientation):
+    """Rotate/flip an image so it displays upright."""
+    transpose = ORIENTATION_TRANSPOSE.get(orientation)
+    return pil_image.transpose(transpose) if transpose is not None else pil_image
+
+
+def to_surface(pil_image):
+    pil_image = pil_image.convert('RGB')
+    return pygame.image.fromstring(pil_image.tobytes(), pil_image.size, pil_image.mode)
+
+
+def decode_image(image_path, size):
+    """Decode an image scaled to fit size, letting the JPEG decoder skip the pixels we'd throw away."""
+    orientation = get_metadata(image_path).orientation  # Shared with every other metadata reader
+    with profiler.stage("decode"):
+        pil_image = Image.open(image_path)
+        if pil_image.format == "JPEG":
+            # Orientations 5-8 are stored sideways, so the draft size is in the stored (swapped) axes
+            draft_size = (size[1], size[0]) if orientation >= 5 else size
+            pil_image.draft('RGB', draft_size)  # Decode at 1/2, 1/4 or 1/8 scale where possible
+        pil_image = orient(pil_image.convert('RGB'), orientation)
+    with profiler.stage("scale"):
+        pil_image.thumbnail(size)
+        return to_surface(pil_image)
+
+
+def decode_exif_thumbnail(image_path, size):
+    """Return the embedded EXIF thumbnail scaled to fit size for a quick first paint, or None."""
+    try:
+        exif_bytes, width, height = read_header(image_path)  # Only reads the header segments
+        if not exif_bytes or not width or not height:
+            return None
+        thumbnail_bytes = piexif.load(exif_bytes).get("thumbnail")
+        if not thumbnail_bytes:
+            return None
+        orientation = get_metadata(image_path).orientation
+        thumbnail = orient(Image.open(io.BytesIO(thumbnail_bytes)).convert('RGB'), orientation)
+    except Exception:
+        return None
+    # Scale to the size the sharp frame will have, so swapping it in doesn't make the image jump
+    if orientation >= 5:
+        width, height = height, width
+    scale = min(size[0] / width, size[1] / height, 1)
+    target = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return pygame.transform.smoothscale(to_surface(thumbnail), target)
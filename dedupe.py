@@ -0,0 +1,141 @@
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from PIL import Image
+from prescan import print_progress
+
+HASH_SIZE = 8  # 8x8 gradient bits, a 64-bit hash
+MAX_DISTANCE = 6  # Hashes at most this many bits apart count as near-duplicates
+
+
+def dhash(image):
+    """Difference hash: one bit per neighbouring pixel pair of a 9x8 grayscale copy, set where brightness rises."""
+    pixels = list(image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR).getdata())
+    value = 0
+    for row in range(HASH_SIZE):
+        for column in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + column]
+            value = (value << 1) | (pixels[row * (HASH_SIZE + 1) + column + 1] > left)
+    return value
+
+
+def hash_image(image_path, index):
+    """Hash the index's small thumbnail, so no full-size decode is needed."""
+    return dhash(Image.open(io.BytesIO(index.get_thumbnail(image_path))))
+
+
+def compute_hashes(images, index, workers=None, out=sys.stderr):
+    """Return {image path: hash} for every image, hashing only the ones without a fresh hash in the index."""
+    start = time.perf_counter()
+    stored = index.hashes()
+    hashes = {}
+    stale = {}  # Image path -> stat taken before hashing
+    for image_path in images:
+        stat = Path(image_path).stat()
+        row = stored.get(index.key(image_path))
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            hashes[image_path] = row[2]
+        else:
+            stale[image_path] = stat
+
+    done = len(hashes)
+    workers = workers or min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(hash_image, image_path, index): image_path for image_path in stale}
+        for future in as_completed(futures):
+            image_path = futures[future]
+            try:
+                hashes[image_path] = future.result()
+                index.set_hash(image_path, stale[image_path], hashes[image_path])
+            except Exception:
+                pass  # Unreadable images just don't get grouped
+            done += 1
+            if done % 25 == 0 or done == len(images):
+                print_progress(done, len(images), start, out)
+    if not stale:
+        print_progress(done, len(images), start, out)
+    out.write(f"\nHashing: {len(stale)} hashed, {len(images) - len(stale)} already indexed "
+              f"in {time.perf_counter() - start:.2f}s\n")
+    return hashes
+
+
+class MultiIndex:
+    """Multi-index hashing: candidates within radius bits share at least two exact chunks of the hash.
+
+    The hash is cut into radius + 2 chunks, so by the pigeonhole principle two hashes at most radius bits
+    apart agree exactly on at least two chunks. Every pair of chunks is a bucket key; a search only compares
+    against hashes sharing one of its keys, instead of against every hash.
+    """
+
+    def __init__(self, radius, bits=HASH_SIZE * HASH_SIZE):
+        self.radius = radius
+        chunks = min(radius + 2, bits)
+        bounds = [bits * i // chunks for i in range(chunks + 1)]
+        self.chunks = [(bounds[i], (1 << (bounds[i + 1] - bounds[i])) - 1, bounds[i + 1] - bounds[i])
+                       for i in range(chunks)]  # (shift, mask, width)
+        self.pairs = [(a, b) for a in range(chunks) for b in range(a + 1, chunks)]
+        # Per chunk pair: the two chunks packed into a small int -> a hash, or a list once there are several
+        self.buckets = [{} for _ in self.pairs]
+
+    def keys(self, value):
+        parts = [(value >> shift) & mask for shift, mask, _ in self.chunks]
+        return [parts[a] | (parts[b] << self.chunks[a][2]) for a, b in self.pairs]
+
+    def add(self, value):
+        for buckets, key in zip(self.buckets, self.keys(value)):
+            found = buckets.get(key)
+            if found is None:
+                buckets[key] = value  # Most buckets hold one hash; don't spend a list on them
+            elif isinstance(found, list):
+                found.append(value)
+            else:
+                buckets[key] = [found, value]
+
+    def search(self, value):
+        """Return every stored hash within radius bits of value."""
+        candidates = set()
+        for buckets, key in zip(self.buckets, self.keys(value)):
+            found = buckets.get(key)
+            if isinstance(found, list):
+                candidates.update(found)
+            elif found is not None:
+                candidates.add(found)
+        return [other for other in candidates if bin(other ^ value).count("1") <= self.radius]
+
+
+def find_groups(hashes, max_distance=MAX_DISTANCE):
+    """Cluster images whose hashes are within max_distance bits, transitively. Returns lists of image paths."""
+    by_hash = {}  # Identical hashes are grouped up front and are indexed once
+    for image_path, value in hashes.items():
+        by_hash.setdefault(value, []).append(image_path)
+
+    lookup = MultiIndex(max_distance)
+    for value in by_hash:
+        lookup.add(value)
+
+    parent = {value: value for value in by_hash}  # Union-find over distinct hashes
+
+    def find(value):
+        while parent[value] != value:
+            parent[value] = parent[parent[value]]
+            value = parent[value]
+        return value
+
+    for value in by_hash:
+        for other in lookup.search(value):
+            a, b = find(value), find(other)
+            if a != b:
+                parent[a] = b
+
+    clusters = {}
+    for value, paths in by_hash.items():
+        clusters.setdefault(find(value), []).extend(paths)
+    return [paths for paths in clusters.values() if len(paths) > 1]
+
+
+def best_shot(group):
+    """Pick the image to keep by default: the largest file, which for a burst is usually the sharpest."""
+    return max(group, key=lambda image_path: Path(image_path).stat().st_size)
@@ -0,0 +1,72 @@
+import time
+from collections import deque
+import pygame
+from overlay import OverlayRenderer
+
+DEFAULT_WINDOW_SIZE = (800, 600)
+FRAME_SAMPLES = 1000  # Most recent frame times kept for the mean and p95, so a long session doesn't grow the list
+
+
+class LoopStats:
+    """Frame times and idle time of the event loop, so the cost of an idle viewer can be measured."""
+
+    def __init__(self):
+        self.frame_times = deque(maxlen=FRAME_SAMPLES)  # Seconds spent drawing each of the last frames
+        self.frames = 0  # Frames drawn in total
+        self.wait_time = 0.0  # Seconds spent blocked waiting for events
+        self.wakeups = 0  # Times the loop woke up, for an event or a timeout
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+
+    def add_frame(self, seconds):
+        self.frame_times.append(seconds)
+        self.frames += 1
+
+    def add_wait(self, seconds):
+        self.wait_time += seconds
+        self.wakeups += 1
+
+    def summary(self):
+        wall = max(time.perf_counter() - self.start_wall, 1e-9)
+        cpu = time.process_time() - self.start_cpu
+        frames = sorted(self.frame_times)
+        mean_ms = 1000 * sum(frames) / len(frames) if frames else 0.0
+        p95_ms = 1000 * frames[int(0.95 * (len(frames) - 1))] if frames else 0.0
+        return (f"{self.frames} frames, {mean_ms:.2f} ms mean / {p95_ms:.2f} ms p95 per frame, "
+                f"{self.wakeups} wakeups, idle {100 * self.wait_time / wall:.1f}% of {wall:.1f}s, "
+                f"CPU {100 * cpu / wall:.1f}%")
+
+
+class DisplaySession:
+    """One long-lived pygame window shared by every ImageViewer in a session."""
+
+    def __init__(self, size=DEFAULT_WINDOW_SIZE, caption="Image Renamer"):
+        pygame.init()
+        pygame.display.set_caption(caption)
+        self.screen = pygame.display.set_mode(size, pygame.RESIZABLE)
+        pygame.event.set_blocked([pygame.MOUSEMOTION, pygame.MOUSEBUTTONUP])  # Don't wake the loop for these
+        self.stats = LoopStats()
+        self.fonts = {}  # (name, size) -> pygame.font.Font, created once per session
+        self.overlay = OverlayRenderer(self.get_font(24))  # Keeps rendered text and the last frame around
+
+    def get_size(self):
+        return self.screen.get_size()
+
+    def get_font(self, size, name=None):
+        """Return a cached font, so the system font lookup happens only once."""
+        key = (name, size)
+        font = self.fonts.get(key)
+        if font is None:
+            font = pygame.font.SysFont(name, size)
+            self.fonts[key] = font
+        return font
+
+    def resize(self, size):
+        """Handle a VIDEORESIZE event by recreating the window surface at the new size."""
+        self.screen = pygame.display.set_mode(size, pygame.RESIZABLE)
+        self.overlay.invalidate()
+        return self.screen
+
+    def close(self):
+        print(f"Event loop: {self.stats.summary()}")
+        pygame.quit()
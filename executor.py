@@ -0,0 +1,176 @@
+import json
+import os
+import time
+from pathlib import Path
+from jsonl import truncate_torn_tail
+
+JOURNAL_FILENAME = ".image_renamer_journal.jsonl"
+SYNC_EVERY = 100  # Moves between journal fsyncs; a crash can lose at most this many "done" lines
+
+
+class RenameExecutor:
+    """Performs renames and delete-moves in-process, with an fsync'd journal so runs can be resumed or undone.
+
+    The journal is a JSON-lines file in the photo folder:
+        {"op": "begin", "moves": [[source, destination], ...]}
+        {"op": "done", "i": 3}            one line per finished move
+        {"op": "skipped", "i": 4, "reason": "..."}
+        {"op": "commit"}
+        {"op": "undo"}, {"op": "undone", "i": 3}, {"op": "undo_commit"}
+    """
+
+    def __init__(self, folder):
+        self.folder = Path(folder)
+        self.journal_path = self.folder / JOURNAL_FILENAME
+        self.journal = None
+        self.unsynced = 0
+        self.valid_end = 0  # Byte offset just past the last journal line that parsed
+
+    def read_journal(self):
+        """Return (moves, done indices, skipped indices, ops seen), or (None, set(), set(), []) if there is none."""
+        moves, done, skipped, ops = None, set(), set(), []
+        self.valid_end = 0
+        if not self.journal_path.exists():
+            return moves, done, skipped, ops
+        with open(self.journal_path, "rb") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # Torn last line from a crash; everything before it is valid
+                self.valid_end += len(line)
+                ops.append(entry["op"])
+                if entry["op"] == "begin":
+                    moves = [tuple(move) for move in entry["moves"]]
+                elif entry["op"] == "done":
+                    done.add(entry["i"])
+                elif entry["op"] == "skipped":
+                    skipped.add(entry["i"])
+                elif entry["op"] == "undone":
+                    done.discard(entry["i"])
+        return moves, done, skipped, ops
+
+    def performed_but_unjournaled(self, moves, pending, reverse=False):
+        """Pending moves (in the order they run) that a crash made after the journal's last sync.
+
+        Moves run strictly in order and skips are synced at once, so every move up to the last one whose effect is
+        visible (source gone, destination present) was made. Checking each move on its own would misread the
+        chains and cycles plan_renames produces, where a later move refills an earlier move's source.
+        """
+        window = pending[:SYNC_EVERY]  # Later moves can't have run without a sync in between
+        for n in range(len(window), 0, -1):
+            source, destination = moves[window[n - 1]]
+            if reverse:
+                source, destination = destination, source
+            if not (self.folder / source).exists() and (self.folder / destination).exists():
+                return set(window[:n])
+        return set()
+
+    def status(self):
+        """One of "none", "incomplete", "complete", "undoing" or "undone"."""
+        moves, _, _, ops = self.read_journal()
+        if moves is None:
+            return "none"
+        if "undo_commit" in ops:
+            return "undone"
+        if "undo" in ops:
+            return "undoing"
+        return "complete" if "commit" in ops else "incomplete"
+
+    def open_for_append(self):
+        """Open the journal read last for appending, dropping a line a crash left half-written."""
+        truncate_torn_tail(self.journal_path, self.valid_end)
+        return open(self.journal_path, "a", encoding="utf-8")
+
+    def write(self, entry, sync=False):
+        self.journal.write(json.dumps(entry) + "\n")
+        self.unsynced += 1
+        if sync or self.unsynced >= SYNC_EVERY:
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            self.unsynced = 0
+
+    def move(self, source, destination):
+        """Move one file, refusing to overwrite anything. Returns None on success or the reason it was skipped."""
+        source_path = self.folder / source
+        destination_path = self.folder / destination
+        if not source_path.exists():
+            return "source missing"
+        if destination_path.exists() and not os.path.samefile(source_path, destination_path):
+            return "destination exists"  # samefile allows case-only renames on case-insensitive filesystems
+        destination_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source_path, destination_path)
+        return None
+
+    def run_moves(self, moves, indices, reverse=False, already_moved=()):
+        """Perform the given moves (backwards when undoing) and journal each one. Returns (moved, skipped)."""
+        moved = skipped = 0
+        for i in indices:
+            source, destination = moves[i]
+            if reverse:
+                source, destination = destination, source
+            if i in already_moved:
+                reason = None  # Moved before a crash, just not journaled yet
+            else:
+                reason = self.move(source, destination)
+            if reason is None:
+                moved += 1
+                self.write({"op": "undone" if reverse else "done", "i": i})
+            else:
+                skipped += 1
+                print(f"Skipped {source} -> {destination}: {reason}")
+                if not reverse:  # Synced, so recovery can rely on every lost line being a "done"
+                    self.write({"op": "skipped", "i": i, "reason": reason}, sync=True)
+        return moved, skipped
+
+    def apply(self, moves):
+        """Start a new journaled run. Refuses to start while a previous run is incomplete."""
+        if self.status() in ("incomplete", "undoing"):
+            raise RuntimeError(f"{self.journal_path} has an unfinished run; use --recover or --undo first")
+        start = time.perf_counter()
+        with open(self.journal_path, "w", encoding="utf-8") as self.journal:
+            self.write({"op": "begin", "time": time.time(), "moves": moves}, sync=True)
+            moved, skipped = self.run_moves(moves, range(len(moves)))
+            self.write({"op": "commit"}, sync=True)
+        self.report("Applied", moved, skipped, start)
+        return moved, skipped
+
+    def recover(self):
+        """Finish an interrupted run from its journal."""
+        moves, done, skipped, ops = self.read_journal()
+        if moves is None or "commit" in ops or "undo" in ops:
+            print("Nothing to recover.")
+            return 0, 0
+        start = time.perf_counter()
+        pending = [i for i in range(len(moves)) if i not in done and i not in skipped]
+        already_moved = self.performed_but_unjournaled(moves, pending)
+        with self.open_for_append() as self.journal:
+            moved, skipped = self.run_moves(moves, pending, already_moved=already_moved)
+            self.write({"op": "commit"}, sync=True)
+        self.report("Recovered", moved, skipped, start)
+        return moved, skipped
+
+    def undo(self):
+        """Replay the journal in reverse, moving every finished move back where it came from."""
+        moves, done, skipped, ops = self.read_journal()
+        if moves is None or "undo_commit" in ops:
+            print("Nothing to undo.")
+            return 0, 0
+        start = time.perf_counter()
+        already_undone = set()
+        if "undo" not in ops:  # Also undo moves a crashed run made without journaling them
+            pending = [i for i in range(len(moves)) if i not in done and i not in skipped]
+            done |= self.performed_but_unjournaled(moves, pending)
+        else:  # Resuming an undo, whose last "undone" lines may have been lost the same way
+            already_undone = self.performed_but_unjournaled(moves, sorted(done, reverse=True), reverse=True)
+        with self.open_for_append() as self.journal:
+            if "undo" not in ops:
+                self.write({"op": "undo"}, sync=True)
+            moved, skipped = self.run_moves(moves, sorted(done, reverse=True), reverse=True,
+                                            already_moved=already_undone)
+            self.write({"op": "undo_commit"}, sync=True)
+        self.report("Undid", moved, skipped, start)
+        return moved, skipped
+
+    def report(self, action, moved, skipped, start):
+        print(f"{action} {moved} moves ({skipped} skipped) in {time.perf_counter() - start:.2f}s; journal: {self.journal_path}")
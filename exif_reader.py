@@ -1,41 +1,82 @@
+import struct
+import threading
 from PIL import Image
 import piexif
 from datetime import datetime
 from pathlib import Path
+from profiler import profiler
 
-def get_image_date(image_path: Path) -> datetime:
-    try:
-        exif_dict = piexif.load(str(image_path))
-        date_str = exif_dict['Exif'][piexif.ExifIFD.DateTimeOriginal].decode()
-        return datetime.strptime(date_str, "%Y:%m:%d %H:%M:%S")
-    except Exception:
-        # Fallback to file modification time
-        return datetime.fromtimestamp(image_path.stat().st_mtime)
+JPEG_SOI = b"\xff\xd8"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Start-of-frame markers carry the image dimensions (C4, C8 and CC are other segment types)
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
 
-def set_image_date(image_path: Path, date: datetime):
-    """Set the EXIF date for the image."""
-    try:
-        exif_dict = piexif.load(str(image_path))
-        date_str = date.strftime("%Y:%m:%d %H:%M:%S")
-        exif_dict['Exif'][piexif.ExifIFD.DateTimeOriginal] = date_str.encode()
-        piexif.insert(piexif.dump(exif_dict), str(image_path))
-        print(f"EXIF date set for {image_path}: {date_str}")  # Debugging
-    except Exception as e:
-        print(f"Failed to set EXIF date for {image_path}: {e}")  # Debugging
 
-def get_gps_coordinates(image_path: Path):
-    try:
-        exif_dict = piexif.load(str(image_path))
-        gps = exif_dict.get("GPS")
-        if not gps:
-            return None
+class ImageMetadata:
+    """Everything we need from an image header, parsed once and shared by every caller."""
+    __slots__ = ("date", "date_from_exif", "gps", "orientation", "width", "height", "city")
+
+    def __init__(self, date=None, date_from_exif=False, gps=None, orientation=1, width=0, height=0, city=None):
+        self.date = date  # DateTimeOriginal, or the file modification time if there is none
+        self.date_from_exif = date_from_exif  # False when date is the modification time fallback
+        self.gps = gps  # (lat, lon) in decimal degrees, or None
+        self.orientation = orientation  # EXIF orientation, 1 = upright
+        self.width = width  # Stored (unrotated) pixel dimensions
+        self.height = height
+        self.city = city  # Reverse geocoded city, None until it has been looked up
 
-        def to_degrees(value):
-            d, m, s = value
-            return d[0]/d[1] + m[0]/m[1]/60 + s[0]/s[1]/3600
+    def __repr__(self):
+        return (f"ImageMetadata(date={self.date!r}, gps={self.gps!r}, orientation={self.orientation}, "
+                f"size={self.width}x{self.height})")
 
-        lat = to_degrees(gps[piexif.GPSIFD.GPSLatitude])
-        lon = to_degrees(gps[piexif.GPSIFD.GPSLongitude])
+
+def read_header(image_path: Path):
+    """Return (exif_bytes, width, height), reading only the header segments and not the pixel data."""
+    with open(image_path, "rb") as f:
+        signature = f.read(8)
+        if signature[:2] == JPEG_SOI:
+            f.seek(2)
+            exif_bytes = None
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    break
+                if marker[1] in (0xD9, 0xDA):  # End of image or start of scan, no more headers
+                    break
+                length_bytes = f.read(2)
+                if len(length_bytes) < 2:
+                    break
+                length = struct.unpack(">H", length_bytes)[0]
+                if marker[1] == 0xE1 and exif_bytes is None:  # APP1, either EXIF or XMP
+                    payload = f.read(length - 2)
+                    if payload.startswith(b"Exif\x00\x00"):
+                        exif_bytes = payload
+                elif marker[1] in SOF_MARKERS:
+                    height, width = struct.unpack(">xHH", f.read(5))
+                    return exif_bytes, width, height  # EXIF always comes before the frame header
+                else:
+                    f.seek(length - 2, 1)
+            return exif_bytes, 0, 0
+        if signature == PNG_SIGNATURE:
+            width, height = struct.unpack(">II", f.read(16)[8:16])  # IHDR is always the first chunk
+            return None, width, height
+
+    # Anything else: let PIL read the header lazily
+    with Image.open(image_path) as pil_image:
+        return pil_image.info.get("exif"), pil_image.width, pil_image.height
+
+
+def _to_degrees(value):
+    d, m, s = value
+    return d[0]/d[1] + m[0]/m[1]/60 + s[0]/s[1]/3600
+
+
+def _parse_gps(gps):
+    if not gps:
+        return None
+    try:
+        lat = _to_degrees(gps[piexif.GPSIFD.GPSLatitude])
+        lon = _to_degrees(gps[piexif.GPSIFD.GPSLongitude])
 
         if gps[piexif.GPSIFD.GPSLatitudeRef] == b'S':
             lat = -lat
@@ -46,8 +87,67 @@ def get_gps_coordinates(image_path: Path):
     except Exception:
         return None
 
+
+def read_metadata(image_path: Path) -> ImageMetadata:
+    """Parse the EXIF segment of an image once and return its metadata record."""
+    metadata = ImageMetadata()
+    with profiler.stage("metadata"):
+        try:
+            exif_bytes, metadata.width, metadata.height = read_header(image_path)
+            exif_dict = piexif.load(exif_bytes) if exif_bytes else {}
+        except Exception:
+            exif_dict = {}
+
+    try:
+        date_str = exif_dict['Exif'][piexif.ExifIFD.DateTimeOriginal].decode()
+        metadata.date = datetime.strptime(date_str, "%Y:%m:%d %H:%M:%S")
+        metadata.date_from_exif = True
+    except Exception:
+        # Fallback to file modification time
+        metadata.date = datetime.fromtimestamp(Path(image_path).stat().st_mtime)
+
+    metadata.gps = _parse_gps(exif_dict.get("GPS"))
+    metadata.orientation = exif_dict.get("0th", {}).get(piexif.ImageIFD.Orientation, 1)
+    return metadata
+
+
+_metadata_cache = {}  # str(path) -> (mtime_ns, size, ImageMetadata)
+_metadata_lock = threading.Lock()
+
+
+def get_metadata(image_path: Path) -> ImageMetadata:
+    """Return the shared metadata record for an image, parsing it only if the file changed."""
+    stat = Path(image_path).stat()
+    key = str(image_path)
+    with _metadata_lock:
+        cached = _metadata_cache.get(key)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    metadata = read_metadata(image_path)
+    remember_metadata(image_path, stat, metadata)
+    return metadata
+
+
+def remember_metadata(image_path: Path, stat, metadata: ImageMetadata):
+    """Share a record obtained elsewhere (e.g. the on-disk index) with every get_metadata caller."""
+    with _metadata_lock:
+        _metadata_cache[str(image_path)] = (stat.st_mtime_ns, stat.st_size, metadata)
+
+
+def get_image_date(image_path: Path) -> datetime:
+    return get_metadata(image_path).date
+
+def set_image_date(image_path: Path, date: datetime):
+    """Set the EXIF date for the image, rewriting only its metadata segments. Returns what writeback did."""
+    from writeback import write_metadata  # writeback imports this module
+    return write_metadata(image_path, date=date)
+
+def get_gps_coordinates(image_path: Path):
+    return get_metadata(image_path).gps
+
 # For testing
 if __name__ == "__main__":
     test_path = Path("./photos/IMG_7776.jpg")
+    print("Metadata:", get_metadata(test_path))
     print("Date:", get_image_date(test_path))
     print("GPS:", get_gps_coordinates(test_path))
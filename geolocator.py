@@ -1,20 +1,293 @@
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
+import atexit
+import csv
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from profiler import profiler
+
+EARTH_RADIUS_KM = 6371.0
+MAX_OFFLINE_DISTANCE_KM = 30.0  # Further than this from any known place, ask the fallback instead
+# Looked for when no gazetteer is given; GeoNames' cities1000.txt or a name,lat,lon CSV both work
+BUNDLED_GAZETTEERS = [Path(__file__).parent / "data" / "cities1000.txt", Path(__file__).parent / "data" / "cities.csv"]
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "image_renamer"
+DEFAULT_CELL_SIZE = 0.01  # Degrees, roughly 1 km; photos in the same cell share one lookup
+DEFAULT_CACHE_TTL = 90 * 24 * 3600  # Seconds before a cached city is looked up again
+DEFAULT_CACHE_ENTRIES = 100000
+
+
+def to_unit_vector(lat, lon):
+    """Map a coordinate onto the unit sphere, so straight-line distance orders points like great-circle distance."""
+    lat, lon = math.radians(lat), math.radians(lon)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+class KDTree:
+    """Minimal 3-d tree over unit vectors for nearest-neighbour lookups."""
+
+    def __init__(self, points):
+        self.points = points
+        self.root = self.build(list(range(len(points))), 0)
+
+    def build(self, indices, depth):
+        if not indices:
+            return None
+        axis = depth % 3
+        indices.sort(key=lambda i: self.points[i][axis])
+        median = len(indices) // 2
+        return (indices[median], axis,
+                self.build(indices[:median], depth + 1),
+                self.build(indices[median + 1:], depth + 1))
+
+    def nearest(self, target):
+        """Return (index, chord distance) of the point closest to target."""
+        best_index, best_dist2 = None, float("inf")
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            index, axis, left, right = node
+            point = self.points[index]
+            dist2 = (point[0] - target[0]) ** 2 + (point[1] - target[1]) ** 2 + (point[2] - target[2]) ** 2
+            if dist2 < best_dist2:
+                best_index, best_dist2 = index, dist2
+            diff = target[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            if diff * diff < best_dist2:  # The other side can only help if the splitting plane is close enough
+                stack.append(far)
+            stack.append(near)  # Searched first, since it's popped next
+        return best_index, math.sqrt(best_dist2)
+
+
+def read_gazetteer(path: Path, min_population=0):
+    """Read (name, lat, lon) rows from a GeoNames dump (tab-separated) or a CSV with name/lat/lon columns."""
+    places = []
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.suffix.lower() == ".txt":  # GeoNames: name in column 1, lat/lon in 4/5, population in 14
+            for row in csv.reader(f, delimiter="\t", quoting=csv.QUOTE_NONE):
+                if len(row) > 14 and (not min_population or int(row[14] or 0) >= min_population):
+                    places.append((row[1], float(row[4]), float(row[5])))
+        else:
+            for row in csv.DictReader(f):
+                name = row.get("name") or row.get("city")
+                lat = row.get("lat") or row.get("latitude")
+                lon = row.get("lon") or row.get("lng") or row.get("longitude")
+                if name and lat and lon:
+                    places.append((name, float(lat), float(lon)))
+    return places
+
+
+class OfflineGeocoder:
+    """Nearest-city lookups against a local gazetteer, answered from a k-d tree without any network calls.
+
+    The gazetteer is read on a background thread, so startup doesn't wait for it; the first lookup does.
+    If it can't be read, the error is kept in self.error and every lookup fails over to the next backend.
+    """
+
+    def __init__(self, gazetteer_path, max_distance_km=MAX_OFFLINE_DISTANCE_KM, min_population=0):
+        self.gazetteer_path = Path(gazetteer_path)
+        self.min_population = min_population
+        self.max_distance_km = max_distance_km
+        self.names = None
+        self.tree = None
+        self.error = None  # Why the gazetteer couldn't be read, if it couldn't
+        self.lock = threading.Lock()
+        threading.Thread(target=self.load, name="gazetteer", daemon=True).start()
+
+    def load(self):
+        with self.lock:
+            if self.names is None:
+                try:
+                    places = read_gazetteer(self.gazetteer_path, self.min_population)
+                except (OSError, ValueError, csv.Error) as e:
+                    self.error = e
+                    places = []
+                    print(f"Failed to read gazetteer {self.gazetteer_path}: {e}")
+                self.tree = KDTree([to_unit_vector(lat, lon) for _, lat, lon in places])
+                self.names = [name for name, _, _ in places]
+
+    def reverse_geocode(self, lat: float, lon: float):
+        """Return the nearest city name, "" if nothing is close enough, or None if the gazetteer is unreadable."""
+        if self.names is None:
+            self.load()  # Waits for the background load
+        if self.error is not None:
+            return None
+        if not self.names:
+            return ""
+        index, chord = self.tree.nearest(to_unit_vector(lat, lon))
+        if chord_to_km(chord) > self.max_distance_km:
+            return ""
+        return self.names[index]
+
+
+class NominatimGeocoder:
+    """Online lookups through OpenStreetMap's Nominatim, with a bounded number of retries."""
+
+    def __init__(self, retries=2, timeout=10, **kwargs):
+        self.retries = retries
+        self.timeout = timeout
+        self.options = kwargs
+        self.client = None  # geopy is imported and the client built on the first lookup
+
+    def reverse_geocode(self, lat: float, lon: float):
+        """Return the city, town or village name ("" if there is none), or None if the lookup failed."""
+        from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
+        if self.client is None:
+            from geopy.geocoders import Nominatim
+            self.client = Nominatim(user_agent="image_renamer", **self.options)
+        for _ in range(self.retries + 1):
+            try:
+                location = self.client.reverse((lat, lon), language='en', timeout=self.timeout)
+                if location and "address" in location.raw:
+                    address = location.raw["address"]
+                    # Prioritize city, then town, then village
+                    return address.get("city") or address.get("town") or address.get("village") or ""
+                return ""
+            except (GeocoderTimedOut, GeocoderUnavailable):
+                continue  # Retry, up to self.retries times
+            except Exception:
+                return None
+        return None
+
+
+class GeocodeCache:
+    """Memoizes lookups per grid cell, in memory (LRU) and in a JSON file shared across sessions (TTL)."""
+
+    def __init__(self, path=None, cell_size=DEFAULT_CELL_SIZE, ttl=DEFAULT_CACHE_TTL, max_entries=DEFAULT_CACHE_ENTRIES):
+        self.path = Path(path) if path else CACHE_DIR / "geocode_cache.json"
+        self.cell_size = cell_size
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # "lat_cell,lon_cell" -> (city, time looked up)
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def cell(self, lat, lon):
+        return f"{math.floor(lat / self.cell_size)},{math.floor(lon / self.cell_size)}"
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("cell_size") != self.cell_size:  # Cells from another grid don't line up with ours
+            return
+        now = time.time()
+        for key, (city, looked_up) in data.get("entries", {}).items():
+            if now - looked_up < self.ttl:
+                self.entries[key] = (city, looked_up)
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = {"cell_size": self.cell_size, "entries": dict(self.entries)}
+            self.dirty = False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.path.with_suffix(".tmp")
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Failed to save geocode cache {self.path}: {e}")
+
+    def get(self, lat, lon):
+        """Return the cached city for the cell containing (lat, lon), or None on a miss."""
+        key = self.cell(lat, lon)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.time() - entry[1] >= self.ttl:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, lat, lon, city):
+        key = self.cell(lat, lon)
+        with self.lock:
+            self.entries[key] = (city, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.dirty = True
+
+
+geocoders = []  # Backends asked in order until one knows the place
+cache = None  # GeocodeCache in front of the backends, set up by configure()
+configure_lock = threading.Lock()
+
+
+def configure(gazetteer=None, online=True, max_distance_km=MAX_OFFLINE_DISTANCE_KM, cell_size=DEFAULT_CELL_SIZE,
+              cache_ttl=DEFAULT_CACHE_TTL, cache_path=None, nominatim_options=None):
+    """Set up the backend chain: the local gazetteer first, then Nominatim as an optional fallback.
+
+    nominatim_options are passed on to geopy, e.g. {"domain": "localhost:8080", "scheme": "http"} for a local server.
+    Raises ValueError if the gazetteer given (or set in IMAGE_RENAMER_GAZETTEER) doesn't exist.
+    """
+    global cache
+    gazetteer = gazetteer or os.environ.get("IMAGE_RENAMER_GAZETTEER")
+    if gazetteer and not Path(gazetteer).is_file():  # Checked first, so a typo fails here rather than on every lookup
+        raise ValueError(f"gazetteer not found: {gazetteer}")
+    geocoders.clear()
+    if cache is not None:
+        cache.save()
+    cache = GeocodeCache(cache_path, cell_size=cell_size, ttl=cache_ttl)
+    atexit.register(cache.save)
+    if not gazetteer:
+        gazetteer = next((path for path in BUNDLED_GAZETTEERS if path.exists()), None)
+    if gazetteer:
+        geocoders.append(OfflineGeocoder(gazetteer, max_distance_km))
+    if online:
+        geocoders.append(NominatimGeocoder(**(nominatim_options or {})))
+
+
+def locate(lat: float, lon: float):
+    """Return the city name ("" if no backend knows one), or None if every backend failed."""
+    with configure_lock:
+        if cache is None:
+            configure()
+    city = cache.get(lat, lon)
+    if city is not None:
+        return city
+    city = ""
+    with profiler.stage("geocode"):  # Cache misses only
+        for geocoder in geocoders:
+            city = geocoder.reverse_geocode(lat, lon)
+            if city:
+                break
+    if city is not None:  # None when the last backend failed, so callers know not to remember the answer
+        cache.put(lat, lon, city)
+    return city
+
+
+def locate_many(points):
+    """Look up many (lat, lon) points, querying each grid cell only once. Returns {point: city or None}."""
+    with configure_lock:
+        if cache is None:
+            configure()
+    representatives = {}  # Cell -> first point seen in it
+    for point in points:
+        representatives.setdefault(cache.cell(*point), point)
+    cities = {cell: locate(*point) for cell, point in representatives.items()}
+    return {point: cities[cache.cell(*point)] for point in points}
 
-geolocator = Nominatim(user_agent="image_renamer")
 
 def reverse_geocode(lat: float, lon: float) -> str:
-    try:
-        location = geolocator.reverse((lat, lon), language='en', timeout=10)
-        if location and "address" in location.raw:
-            address = location.raw["address"]
-            # Prioritize city, then town, then village
-            return address.get("city") or address.get("town") or address.get("village") or ""
-        return ""
-    except GeocoderTimedOut:
-        return reverse_geocode(lat, lon)  # Retry once
-    except Exception:
-        return ""
+    return locate(lat, lon) or ""
 
 # For testing
 if __name__ == "__main__":
@@ -0,0 +1,243 @@
+import io
+import time
+import pygame
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from decoder import orient, to_surface
+from image_cache import image_cache
+from renamer import apply_fields
+
+THUMBNAIL_SIZE = (160, 120)
+CELL_WIDTH, CELL_HEIGHT = 180, 160  # Thumbnail plus its label and some spacing
+MARGIN = 10
+STATUS_HEIGHT = 30
+THUMBNAIL_READY = pygame.USEREVENT + 2  # Posted by the loader threads so the grid wakes up and redraws
+IDLE_TIMEOUT_MS = 250
+
+BACKGROUND_COLOR = (30, 30, 30)
+PLACEHOLDER_COLOR = (60, 60, 60)
+CURSOR_COLOR = (255, 255, 0)  # Yellow like the filename line in the viewer
+SELECTED_COLOR = (80, 160, 255)
+DELETED_COLOR = (220, 50, 50)
+TEXT_COLOR = (255, 255, 255)
+DIM_TEXT_COLOR = (150, 150, 150)
+
+
+class GridView:
+    """Contact sheet of thumbnails for bulk triage: multi-select, delete, and set prefix/description at once.
+
+    Only the rows on screen are decoded (from the index's small thumbnails, on a thread pool), so the
+    grid scrolls through thousands of photos without decoding them all.
+    """
+
+    def __init__(self, display, images, changes, index=None, cursor=0, title="Grid", group=False):
+        self.display = display
+        self.images = images
+        self.changes = changes
+        self.index = index  # MetadataIndex providing thumbnails and metadata
+        self.cursor = cursor
+        self.title = title
+        self.group = group  # Showing one group of near-duplicates, so Ctrl+K may keep one of the whole grid
+        self.top_row = 0  # First visible row
+        self.selected = set()
+        self.modified = set()  # Indices whose change entry was edited here
+        self.input_field = None  # "prefix" or "description" while typing a value for the selection
+        self.input_text = ""
+        self.running = True
+        self.quit = False  # Window was closed
+        self.loader = ThreadPoolExecutor(max_workers=4, thread_name_prefix="thumbnails")
+        self.loading = {}  # Image index -> future, for visible cells still being decoded
+
+    def columns(self):
+        return max(1, (self.display.get_size()[0] - MARGIN) // CELL_WIDTH)
+
+    def visible_rows(self):
+        return max(1, (self.display.get_size()[1] - STATUS_HEIGHT - MARGIN) // CELL_HEIGHT)
+
+    def visible_range(self):
+        first = self.top_row * self.columns()
+        return range(first, min(len(self.images), first + self.visible_rows() * self.columns()))
+
+    def load_thumbnail(self, i):
+        image_path = self.images[i]
+        if self.index:
+            data = self.index.get_thumbnail(image_path)
+            orientation = self.index.load(image_path).orientation
+            pil_image = Image.open(io.BytesIO(data))
+        else:
+            pil_image = Image.open(image_path)
+            orientation = 1
+            pil_image.draft('RGB', THUMBNAIL_SIZE)
+        pil_image = orient(pil_image.convert('RGB'), orientation)
+        pil_image.thumbnail(THUMBNAIL_SIZE)
+        image_cache.put(image_path, THUMBNAIL_SIZE, to_surface(pil_image))
+        pygame.event.post(pygame.event.Event(THUMBNAIL_READY, index=i))
+
+    def request_thumbnails(self):
+        """Queue decodes for visible cells and cancel the ones that scrolled out of view."""
+        visible = self.visible_range()
+        for i in list(self.loading):
+            if i not in visible and self.loading[i].cancel():
+                del self.loading[i]
+        for i in visible:
+            if i not in self.loading and image_cache.get(self.images[i], THUMBNAIL_SIZE) is None:
+                self.loading[i] = self.loader.submit(self.load_thumbnail, i)
+
+    def scroll_to_cursor(self):
+        row = self.cursor // self.columns()
+        if row < self.top_row:
+            self.top_row = row
+        elif row >= self.top_row + self.visible_rows():
+            self.top_row = row - self.visible_rows() + 1
+
+    def targets(self):
+        """The images an action applies to: the selection, or the cursor if nothing is selected."""
+        return sorted(self.selected) if self.selected else [self.cursor]
+
+    def set_field(self, field, value):
+        for i in self.targets():
+            metadata = self.index.load(self.images[i]) if self.index else None
+            apply_fields(self.changes[i], self.images[i], metadata, **{field: value})
+            self.modified.add(i)
+
+    def toggle_delete(self):
+        targets = self.targets()
+        delete = not all(self.changes[i]["delete"] for i in targets)  # Mixed selections get deleted
+        for i in targets:
+            change = self.changes[i]
+            change["delete"] = delete
+            change["proposed"] = "***DELETED***" if delete else change["original"]
+            self.modified.add(i)
+
+    def keep_cursor(self):
+        """Keep the image under the cursor and mark the others (the selection, or a whole duplicate group) deleted."""
+        others = self.selected or (set(range(len(self.images))) if self.group else set())
+        if not others - {self.cursor}:  # Nothing selected in the full folder grid: never delete everything else
+            return
+        for i in others | {self.cursor}:
+            change = self.changes[i]
+            delete = i != self.cursor
+            if change["delete"] != delete:
+                change["delete"] = delete
+                change["proposed"] = "***DELETED***" if delete else change["original"]
+                self.modified.add(i)
+
+    def move_cursor(self, step, extend=False):
+        if extend:
+            self.selected.add(self.cursor)
+        self.cursor = max(0, min(len(self.images) - 1, self.cursor + step))
+        if extend:
+            self.selected.add(self.cursor)
+        self.scroll_to_cursor()
+
+    def handle_event(self, event):
+        if event.type == pygame.VIDEORESIZE:
+            self.display.resize(event.size)
+            self.scroll_to_cursor()
+        elif event.type == pygame.MOUSEWHEEL:
+            max_row = max(0, (len(self.images) - 1) // self.columns())
+            self.top_row = max(0, min(max_row, self.top_row - event.y))
+        elif event.type == pygame.KEYDOWN and self.input_field:
+            if event.key == pygame.K_RETURN:  # Apply the typed value to every selected image
+                self.set_field(self.input_field, self.input_text.strip())
+                self.input_field = None
+            elif event.key == pygame.K_ESCAPE:
+                self.input_field = None
+            elif event.key == pygame.K_BACKSPACE:
+                self.input_text = self.input_text[:-1]
+            elif event.unicode and event.unicode.isprintable():
+                self.input_text += event.unicode
+        elif event.type == pygame.KEYDOWN:
+            extend = bool(event.mod & pygame.KMOD_SHIFT)
+            if event.key in (pygame.K_ESCAPE, pygame.K_F5, pygame.K_RETURN):  # Back to the viewer at the cursor
+                self.running = False
+            elif event.key == pygame.K_LEFT:
+                self.move_cursor(-1, extend)
+            elif event.key == pygame.K_RIGHT:
+                self.move_cursor(1, extend)
+            elif event.key == pygame.K_UP:
+                self.move_cursor(-self.columns(), extend)
+            elif event.key == pygame.K_DOWN:
+                self.move_cursor(self.columns(), extend)
+            elif event.key == pygame.K_PAGEUP:
+                self.move_cursor(-self.columns() * self.visible_rows(), extend)
+            elif event.key == pygame.K_PAGEDOWN:
+                self.move_cursor(self.columns() * self.visible_rows(), extend)
+            elif event.key == pygame.K_SPACE:  # Toggle selection of the cursor image
+                self.selected ^= {self.cursor}
+            elif event.key == pygame.K_a and event.mod & pygame.KMOD_CTRL:  # Select all / none
+                self.selected = set() if self.selected else set(range(len(self.images)))
+            elif event.key == pygame.K_DELETE:  # Toggle delete for the selection
+                self.toggle_delete()
+            elif event.key == pygame.K_k and event.mod & pygame.KMOD_CTRL:  # Keep the cursor image, delete the rest
+                self.keep_cursor()
+            elif event.key == pygame.K_F2:  # Type a prefix for the selection
+                self.input_field, self.input_text = "prefix", ""
+            elif event.unicode and event.unicode.isprintable():  # Typing starts a description for the selection
+                self.input_field, self.input_text = "description", event.unicode
+
+    def draw(self):
+        screen = self.display.screen
+        screen.fill(BACKGROUND_COLOR)
+        font = self.display.get_font(18)
+        columns = self.columns()
+        for i in self.visible_range():
+            row, column = divmod(i, columns)
+            x = MARGIN + column * CELL_WIDTH
+            y = MARGIN + (row - self.top_row) * CELL_HEIGHT
+            cell = pygame.Rect(x, y, THUMBNAIL_SIZE[0], THUMBNAIL_SIZE[1])
+            thumbnail = image_cache.get(self.images[i], THUMBNAIL_SIZE)
+            if thumbnail is None:
+                pygame.draw.rect(screen, PLACEHOLDER_COLOR, cell)
+            else:
+                screen.blit(thumbnail, thumbnail.get_rect(center=cell.center))
+            change = self.changes[i]
+            if change["delete"]:
+                pygame.draw.line(screen, DELETED_COLOR, cell.topleft, cell.bottomright, 3)
+                pygame.draw.line(screen, DELETED_COLOR, cell.topright, cell.bottomleft, 3)
+            if i in self.selected:
+                pygame.draw.rect(screen, SELECTED_COLOR, cell.inflate(6, 6), 3)
+            if i == self.cursor:
+                pygame.draw.rect(screen, CURSOR_COLOR, cell.inflate(12, 12), 2)
+            label = change["proposed"] if change["proposed"] != change["original"] else change["original"]
+            color = TEXT_COLOR if i in self.modified or change["proposed"] != change["original"] else DIM_TEXT_COLOR
+            screen.blit(font.render(label, True, color), (x, y + THUMBNAIL_SIZE[1] + 8))
+
+        if self.input_field:
+            status = f"{self.input_field.capitalize()} for {len(self.targets())} image(s): {self.input_text}_  [Enter] apply [Esc] cancel"
+        else:
+            status = (f"{self.title}: {self.cursor + 1}/{len(self.images)}, {len(self.selected)} selected  "
+                      f"[Space] select [Shift+arrows] extend [Del] delete [Ctrl+K] keep only this [F2] prefix, type to describe, [Esc] back")
+        screen.blit(font.render(status, True, TEXT_COLOR), (MARGIN, self.display.get_size()[1] - STATUS_HEIGHT + 8))
+        pygame.display.flip()
+
+    def run(self):
+        """Show the grid until the user goes back. Returns the index under the cursor."""
+        self.scroll_to_cursor()
+        self.request_thumbnails()
+        self.draw()
+        stats = self.display.stats
+        while self.running:
+            wait_start = time.perf_counter()
+            events = [pygame.event.wait(IDLE_TIMEOUT_MS)]
+            stats.add_wait(time.perf_counter() - wait_start)
+            events += pygame.event.get()
+            needs_refresh = False
+            for event in events:
+                if event.type == pygame.QUIT:
+                    self.running = False
+                    self.quit = True
+                elif event.type != pygame.NOEVENT:
+                    self.handle_event(event)
+                    needs_refresh = True
+            if needs_refresh and self.running:
+                frame_start = time.perf_counter()
+                self.request_thumbnails()
+                self.draw()
+                stats.add_frame(time.perf_counter() - frame_start)
+
+        for future in self.loading.values():
+            future.cancel()
+        self.loader.shutdown(wait=False)
+        self.display.overlay.invalidate()  # The viewer has to redraw everything after us
+        return self.cursor
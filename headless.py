@@ -0,0 +1,53 @@
+import sys
+import time
+from renamer import apply_fields
+
+RULE_FIELDS = ("date", "prefix", "city", "postfix", "description")  # In the order build_new_filename joins them
+
+
+def parse_rule(spec):
+    """Parse a rule like "date,city,prefix=Holiday" into {field: value or None}.
+
+    Listed fields are included in the new names; a value sets the field for every photo, otherwise it comes from
+    the photo (EXIF date, geocoded city). Like in the viewer, a name that is already "YYYY MM DD <description>"
+    keeps its description unless the rule sets one.
+    """
+    rule = {}
+    for part in spec.split(","):
+        field, _, value = part.partition("=")
+        field = field.strip().lower()
+        if field not in RULE_FIELDS:
+            raise ValueError(f"Unknown field '{field}' in rule, expected one of: {', '.join(RULE_FIELDS)}")
+        rule[field] = value.strip() if value else None
+    return rule
+
+
+def apply_rule(change, image_path, metadata, rule):
+    """Fill a change entry the way typing the rule's values into the viewer would."""
+    fields = {
+        "show_date": "date" in rule,
+        "use_prefix": "prefix" in rule,
+        "include_location": "city" in rule,
+        "prefix": rule.get("prefix") or "",
+        "postfix": rule.get("postfix") or "",
+    }
+    if rule.get("city"):
+        fields["city"] = rule["city"]
+    if rule.get("description"):
+        fields["description"] = rule["description"]
+    apply_fields(change, image_path, metadata, **fields)
+
+
+def rename_by_rule(images, changes, index, rule, out=sys.stderr):
+    """Apply the rule to every image using its indexed metadata. Returns the number of names that changed."""
+    start = time.perf_counter()
+    renamed = 0
+    for image_path, change in zip(images, changes):
+        if change["delete"]:
+            continue
+        apply_rule(change, image_path, index.load(image_path), rule)
+        renamed += change["proposed"] != change["original"]
+    elapsed = time.perf_counter() - start
+    out.write(f"Naming: {len(images)} files, {renamed} new names in {elapsed:.2f}s "
+              f"({len(images) / elapsed if elapsed else 0.0:.1f} files/s)\n")
+    return renamed
@@ -0,0 +1,55 @@
+import threading
+from collections import OrderedDict
+
+DEFAULT_BUDGET_BYTES = 256 * 1024 * 1024  # Enough for a few dozen full-screen surfaces
+
+
+class ImageCache:
+    """Byte-budgeted LRU cache of scaled pygame surfaces, keyed by (path, window size)."""
+
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_BYTES):
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self.entries = OrderedDict()  # key -> (surface, size in bytes)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(image_path, size):
+        return (str(image_path), tuple(size))
+
+    @staticmethod
+    def surface_bytes(surface):
+        return surface.get_bytesize() * surface.get_width() * surface.get_height()
+
+    def get(self, image_path, size):
+        """Return the cached surface for the image at the given window size, or None."""
+        key = self.make_key(image_path, size)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)  # Mark as most recently used
+            return entry[0]
+
+    def put(self, image_path, size, surface):
+        """Store a surface and evict the least recently used entries until within budget."""
+        key = self.make_key(image_path, size)
+        nbytes = self.surface_bytes(surface)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.used_bytes -= old[1]
+            self.entries[key] = (surface, nbytes)
+            self.used_bytes += nbytes
+            while self.used_bytes > self.budget_bytes and len(self.entries) > 1:
+                _, (_, evicted_bytes) = self.entries.popitem(last=False)
+                self.used_bytes -= evicted_bytes
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.used_bytes = 0
+
+
+# Shared by every ImageViewer so navigating back to an image is instant
+image_cache = ImageCache()
@@ -1,23 +1,50 @@
 import pygame
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from PIL import Image
 from datetime import datetime
-from renamer import build_new_filename  # Import the function
-from exif_reader import get_image_date, get_gps_coordinates  # Import GPS and date extraction
+from renamer import build_new_filename, parse_new_filename  # Import the functions
+from exif_reader import get_metadata  # Single-pass EXIF date and GPS extraction
+from metadata_index import load_metadata, resolve_city  # Metadata from the index when fresh, city looked up apart
 from geolocator import reverse_geocode  # Import reverse geocoding
-import re
+from image_cache import image_cache  # Shared cache of decoded, scaled images
+from decoder import decode_image, decode_exif_thumbnail  # Reduced-scale, upright decoding
+from display import DisplaySession  # Long-lived window shared across images
+from profiler import profiler  # Stage timings for --profile
+from voice_input import Dictation  # Background speech recognition, loaded on first use
+from pyramid import ZoomView  # Tiled zoom and pan for checking focus
+from startup import startup  # Startup milestones for --startup
+
+BACKSPACE_REPEAT = pygame.USEREVENT + 1  # Timer event that repeats Backspace while the key is held
+BACKSPACE_REPEAT_MS = 100  # Adjust the delay for auto-repeat
+DICTATION_UPDATE = pygame.USEREVENT + 3  # Posted by the dictation thread when the recognized text changes
+CITY_READY = pygame.USEREVENT + 4  # Posted when the city of an image has been geocoded, after it was painted
+IDLE_TIMEOUT_MS = 250  # Longest the loop sleeps without any events
+REDRAW_EVENTS = {pygame.KEYDOWN, BACKSPACE_REPEAT, DICTATION_UPDATE, CITY_READY, pygame.VIDEORESIZE,
+                 pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.MOUSEWHEEL, pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN}
+SUGGESTION_FIELDS = {"prefix": "prefix", "location": "city", "description": "description"}  # Editing field -> autocomplete field
+DRAG_EVENTS = [pygame.MOUSEMOTION, pygame.MOUSEBUTTONUP]  # Only delivered while zoomed in, for dragging the view
 
 # Global variable for the prefix
 global_prefix = ""
 global_location = ""  # Add global location variable
 global_postfix = ""  # Add global postfix variable
+show_profile = False  # Live stage timings in the overlay (F12, with --profile)
+geocode_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="geocode")  # City lookups without a prefetcher
 
 class ImageViewer:
-    def __init__(self, image_path, change_entry):
+    def __init__(self, image_path, change_entry, metadata_loader=None, display=None, index=None, conflict_check=None,
+                 autocomplete=None, city_loader=None):
         global global_prefix, global_location, global_postfix  # Access the global variables
         self.image_path = image_path
+        self.metadata_loader = metadata_loader  # Optional callable returning prefetched metadata
+        self.city_loader = city_loader  # Optional callable returning a future for the prefetched city
         self.change_entry = change_entry  # Dictionary containing original, proposed, and delete flag
+        self.display = display  # Shared DisplaySession; the viewer creates its own if none is given
+        self.index = index  # Optional MetadataIndex for the photo folder
+        self.conflict_check = conflict_check  # Optional callable: final name -> other files that would get it
+        self.autocomplete = autocomplete  # Optional Autocomplete suggesting earlier prefixes, cities and descriptions
         self.screen = None
         self.running = True
         self.description = change_entry.get("description", "")  # Initialize description from change_entry
@@ -29,6 +56,7 @@ class ImageViewer:
         self.done = False
         self.city = change_entry.get("city", global_location)  # Use the global location if none is set
         self.location_edited = change_entry.get("location_edited", False)  # Track if location was manually edited
+        self.city_pending = False  # City is being geocoded in the background; saved as None until it's known
         self.date = change_entry.get("date", None)  # Initialize date from change_entry
         self.postfix = change_entry.get("postfix", global_postfix)  # Use the global postfix if none is set
         self.editing_field = "description"  # Default to editing the description
@@ -36,55 +64,62 @@ class ImageViewer:
         self.fields = ["date", "prefix", "location", "postfix", "description"]  # Ordered list of fields
         self.previous_image = False  # Flag to indicate moving to the previous image
         self.next_image = False  # Flag to indicate moving to the next image
+        self.show_grid = False  # Flag to switch to the thumbnail grid
         self.backspace_key_held = False  # Track if the backspace key is being held
-        self.backspace_key_timer = 0  # Timer for auto-repeat functionality
         self.backspace_delete_count = 0  # Count the number of characters deleted during a single hold
+        self.dictation = None  # Running Dictation filling in the description
+        self.dictation_base = ""  # Description typed before the dictation started
+        self.dictation_message = ""  # Why voice input isn't working, if it isn't
+        self.zoom = None  # ZoomView while inspecting the image at full resolution (F7)
 
         # Parse the filename if it matches the expected format
         self.parse_filename()
 
         # Load metadata for the current image if not already loaded or manually edited
-        if not self.date:  # Only load EXIF date if no date was parsed from the filename
+        if not self.date or self.city is None:  # Also when the city wasn't known yet when the image was left
             self.load_image_metadata()
 
     def parse_filename(self):
         """Parse the filename to extract the date and description if it matches the expected format."""
         filename = Path(self.image_path).stem  # Get the filename without the extension
-        match = re.match(r"(\d{4} \d{2} \d{2}) (.+)", filename)  # Match "YYYY MM DD <description>"
-        if match:
-            date_str, description = match.groups()
-            try:
-                if not self.date:  # Only set the date if it hasn't been entered
-                    self.date = datetime.strptime(date_str, "%Y %m %d")  # Parse the date
-                    self.date_text = self.date.strftime('%Y %m %d')  # Update editable date text
-                if not self.description:  # Only set the description if it hasn't been entered
-                    self.description = description.strip()  # Load the remainder into the description
-            except ValueError:
-                pass
+        parsed = parse_new_filename(filename)  # Match "YYYY MM DD <description>"
+        if parsed:
+            date, description = parsed
+            if not self.date:  # Only set the date if it hasn't been entered
+                self.date = date  # Parse the date
+                self.date_text = self.date.strftime('%Y %m %d')  # Update editable date text
+            if not self.description:  # Only set the description if it hasn't been entered
+                self.description = description  # Load the remainder into the description
+
+    def get_image_surface(self, screen_size):
+        """Return the image scaled to fit the screen, decoding it only on a cache miss."""
+        image = image_cache.get(self.image_path, screen_size)
+        if image is None:
+            preview = decode_exif_thumbnail(self.image_path, screen_size)
+            if preview is not None:  # Paint the embedded thumbnail while the sharp frame decodes
+                self.draw_frame(preview)
+            image = decode_image(self.image_path, screen_size)
+            image_cache.put(self.image_path, screen_size, image)
+        return image
 
     def show_image(self):
-        pil_image = Image.open(self.image_path).convert('RGB')
-
-        # Get screen dimensions
-        screen_width, screen_height = self.screen.get_size()
-
-        # Resize image to fit the screen dimensions
-        pil_image.thumbnail((screen_width, screen_height))
-        image = pygame.image.fromstring(pil_image.tobytes(), pil_image.size, pil_image.mode)
-        image_rect = image.get_rect(center=(screen_width // 2, screen_height // 2))
-
-        self.screen.fill((30, 30, 30))  # Clear screen with dark gray
-        self.screen.blit(image, image_rect)
-
-        if self.show_overlay:  # Only draw the overlay if it is visible
-            self.draw_overlay()
-
-        pygame.display.flip()
-
-    def draw_overlay(self):
-        # Calculate overlay height dynamically based on the actual number of lines
-        line_height = 36  # Height of each line
-        padding = 10  # Padding above and below the text
+        if self.zoom:
+            frame, redrawn = self.zoom.render(self.screen.get_size())
+            if redrawn:  # Same surface with new contents, so the renderer can't tell it changed
+                self.display.overlay.invalidate()
+            self.draw_frame(frame)
+            return
+        self.draw_frame(self.get_image_surface(self.screen.get_size()))
+
+    def draw_frame(self, image):
+        """Draw the image and overlay; the renderer only redraws what changed since the last frame."""
+        self.display.overlay.draw(self.screen, image, self.overlay_lines() if self.show_overlay else None)
+
+    def overlay_lines(self):
+        """Return the overlay text as [(text, color)]."""
+        if self.zoom:  # Keep the panel small so it covers as little of the image as possible
+            return [(self.zoom.status(), (255, 255, 0)),
+                    ("[+/-/Wheel] zoom  [Arrows/Drag] pan  [F7/Esc] back, other keys go back to editing", (150, 150, 150))]
         lines = []  # Initialize the lines list
 
         # Overlay text
@@ -100,6 +135,8 @@ class ImageViewer:
                 return (255, 255, 0)  # Yellow for the filename line
             if is_instruction:
                 return (150, 150, 150)  # Gray for instruction lines
+            if field_name == "suggestions":
+                return (0, 200, 255)  # Light blue for autocomplete suggestions
             return (255, 255, 255) if self.editing_field == field_name else (150, 150, 150)
 
         date_text = self.date_text if self.editing_field == "date" else (self.date.strftime('%Y %m %d') if self.date else 'Unknown')
@@ -108,45 +145,93 @@ class ImageViewer:
         lines.append((f"[F2] Prefix {'[HIDDEN]' if not self.use_prefix else ''} {'[EDITING]' if self.editing_field == 'prefix' else ''}: {add_cursor(self.prefix, 'prefix')}", "prefix"))
         lines.append((f"[F3] Location {'[HIDDEN]' if not self.include_location else ''} {'[EDITING]' if self.editing_field == 'location' else ''}: {add_cursor(self.city, 'location')}", "location"))
         lines.append((f"Postfix {'[EDITING]' if self.editing_field == 'postfix' else ''}: {add_cursor(self.postfix, 'postfix')}", "postfix"))  # Add postfix line
-        lines.append((f"Description {'[EDITING]' if self.editing_field == 'description' else ''}: {add_cursor(self.description, 'description')}", "description"))
+        if self.dictation:
+            voice = "[LOADING VOICE] " if self.dictation.status == "loading" else "[LISTENING] "
+        else:
+            voice = f"[{self.dictation_message}] " if self.dictation_message else ""
+        lines.append((f"Description {'[EDITING]' if self.editing_field == 'description' else ''}: {voice}{add_cursor(self.description, 'description')}", "description"))
+        if self.autocomplete:  # Always present (if empty), so suggestions coming and going only redraw this line
+            suggestions = self.suggestions()
+            lines.append((f"[Tab] {'  |  '.join(suggestions)}" if suggestions else "", "suggestions"))
 
         if self.change_entry["delete"]:
             lines.append(("Filename: ***DELETED***", None))
         else:
             final_name = self.build_final_filename()
-            lines.append((f"Final Name: {final_name}", None))  # Filename line
+            conflicts = self.find_conflicts(final_name)
+            if conflicts:  # Another file would end up with the same name; the planner will add a suffix
+                others = conflicts[0] + (f" +{len(conflicts) - 1}" if len(conflicts) > 1 else "")
+                lines.append((f"Final Name: {final_name}  [CONFLICT with {others}]", None))
+            else:
+                lines.append((f"Final Name: {final_name}", None))  # Filename line
 
         # Instruction lines
         lines.append(("[Del] to delete, shift F1-F3 reload/clear, ctrl F3 for global city", None))
-        lines.append(("[L/R] to nav  [F4] Show/Hide Overlay [Del] to delete and [Esc] to end", None))
-
-        # Calculate overlay height based on the number of lines
-        overlay_height = len(lines) * line_height + 2 * padding
+        lines.append(("[L/R] to nav  [F4] Show/Hide Overlay [F5] Grid [F7] Zoom [Del] to delete and [Esc] to end", None))
 
-        # Translucent background
-        overlay_rect = pygame.Rect(10, 30, self.screen.get_width() - 20, overlay_height)
-        overlay_surface = pygame.Surface((overlay_rect.width, overlay_rect.height), pygame.SRCALPHA)
-        overlay_surface.fill((0, 0, 0, 150))  # Black with 150 alpha (translucent)
-        self.screen.blit(overlay_surface, (overlay_rect.x, overlay_rect.y))
-
-        font = pygame.font.SysFont(None, int(24))  # Increase font size by 20%
+        colored = []
         for i, (line, field_name) in enumerate(lines):
             is_filename = (i == len(lines) - 3)  # The filename line is the third-to-last line
             is_instruction = (i >= len(lines) - 2)  # The last two lines are instructions
-            text_color = get_text_color(field_name, is_filename, is_instruction)
-            text_surface = font.render(line, True, text_color)
-            self.screen.blit(text_surface, (20, 40 + i * line_height))  # Adjust line spacing proportionally
+            colored.append((line, get_text_color(field_name, is_filename, is_instruction)))
+        if show_profile and profiler.enabled:
+            colored.append((f"[F12] {profiler.live_line()}", (0, 255, 0)))  # Green profiler line
+        return colored
+
+    def suggestions(self):
+        """Earlier values starting with what has been typed into the current field, most used first."""
+        field = SUGGESTION_FIELDS.get(self.editing_field)
+        if not field or not self.autocomplete:
+            return []
+        return self.autocomplete.suggest(field, self.get_current_field_value())
+
+    def accept_suggestion(self):
+        suggestions = self.suggestions()
+        if not suggestions:
+            return
+        if self.editing_field == "prefix":
+            self.prefix = suggestions[0]
+        elif self.editing_field == "location":
+            self.city = suggestions[0]
+            self.location_edited = True  # Mark location as manually edited
+        elif self.editing_field == "description":
+            self.description = suggestions[0]
 
     def handle_event(self, event):
-        global global_prefix, global_location, global_postfix  # Access the global variables
-        if event.type == pygame.KEYDOWN:
+        global global_prefix, global_location, global_postfix, show_profile  # Access the global variables
+        if event.type == pygame.VIDEORESIZE:  # Window was resized, the image gets rescaled on the next draw
+            self.screen = self.display.resize(event.size)
+        elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):  # Window contents were lost, redraw it all
+            self.display.overlay.invalidate()
+        elif event.type == DICTATION_UPDATE:  # New recognized text from the dictation thread
+            if event.dictation is self.dictation:
+                self.handle_dictation()
+        elif event.type == CITY_READY:  # The city was geocoded after the image was painted
+            if event.image_path == self.image_path and self.city_pending:
+                self.city_pending = False
+                if event.city is not None and not self.location_edited:
+                    self.city = event.city
+        elif event.type == pygame.KEYDOWN and self.dictation and event.key != pygame.K_F6:
+            self.stop_dictation()  # Any other key ends dictation, keeping what was recognized so far
+            self.handle_event(event)
+        elif self.zoom and event.type in (pygame.KEYDOWN, pygame.MOUSEWHEEL, pygame.MOUSEBUTTONDOWN,
+                                          pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION):
+            if event.type == pygame.KEYDOWN and event.key in (pygame.K_F7, pygame.K_ESCAPE):
+                self.stop_zoom()
+            elif not self.zoom.handle_event(event, self.screen.get_size()):
+                self.stop_zoom()  # Any other key leaves the zoom and does what it normally does, e.g. Delete
+                self.handle_event(event)
+        elif event.type == BACKSPACE_REPEAT:  # Auto-repeat while Backspace is held
+            if self.backspace_key_held:
+                self.handle_backspace()
+        elif event.type == pygame.KEYDOWN:
             if event.key == pygame.K_ESCAPE:  # End editing and signal to write the batch file
                 self.running = False  # Stop the main loop
                 self.done = True  # Mark the current image as done
             elif event.key == pygame.K_F1 and not (event.mod & pygame.KMOD_SHIFT):  # Toggle inclusion of date in the filename
                 self.show_date = not self.show_date  # Toggle the date visibility
             elif event.key == pygame.K_F1 and (event.mod & pygame.KMOD_SHIFT):  # Reload the date from EXIF
-                exif_date = get_image_date(self.image_path)
+                exif_date = get_metadata(self.image_path).date
                 if exif_date:
                     self.date = exif_date
                     self.date_text = self.date.strftime('%Y %m %d')  # Update editable date text
@@ -163,16 +248,30 @@ class ImageViewer:
                 self.include_location = not self.include_location
             elif event.key == pygame.K_F3 and (event.mod & pygame.KMOD_SHIFT):  
                 # Reload geolocation
-                gps = get_gps_coordinates(self.image_path)  # Get GPS coordinates
+                gps = get_metadata(self.image_path).gps  # Get GPS coordinates
                 if gps:
                     self.city = reverse_geocode(*gps) or ""  # Reload geolocation
                     self.location_edited = False  # Reset manual edit flag
+                    self.city_pending = False
             elif event.key == pygame.K_F3 and (event.mod & pygame.KMOD_CTRL):  
                 # Use global location
                 self.city = global_location  # Set the city to the global location
                 self.location_edited = False  # Reset manual edit flag
+                self.city_pending = False
             elif event.key == pygame.K_F4:  # Toggle overlay visibility
                 self.show_overlay = not self.show_overlay
+            elif event.key == pygame.K_F7:  # Zoom in to check focus
+                self.start_zoom()
+            elif event.key == pygame.K_F6:  # Dictate the description
+                if self.dictation:
+                    self.dictation.stop()  # What was already said is still recognized and filled in
+                else:
+                    self.start_dictation()
+            elif event.key == pygame.K_F12 and profiler.enabled:  # Toggle live profiler numbers
+                show_profile = not show_profile
+            elif event.key == pygame.K_F5:  # Save changes and switch to the thumbnail grid
+                self.done = True
+                self.show_grid = True
             elif event.key == pygame.K_DELETE:  # Toggle delete/undelete for the current file and move to the next image
                 if self.change_entry["delete"]:
                     self.change_entry["delete"] = False
@@ -201,10 +300,13 @@ class ImageViewer:
             elif event.key == pygame.K_LEFT:  # Save changes and move to the previous image
                 self.done = True
                 self.previous_image = True
+            elif event.key == pygame.K_TAB:  # Complete the field with the top suggestion
+                self.accept_suggestion()
             elif event.key == pygame.K_BACKSPACE:  # Handle backspace key
                 self.backspace_key_held = True  # Start tracking the backspace key hold
                 self.backspace_delete_count = 0  # Reset the delete count
                 self.handle_backspace()
+                pygame.time.set_timer(BACKSPACE_REPEAT, BACKSPACE_REPEAT_MS)  # Start auto-repeat
             elif self.editing_field == "date":  # Handle date editing
                 if event.key == pygame.K_RETURN:
                     try:
@@ -240,14 +342,40 @@ class ImageViewer:
             if event.key == pygame.K_BACKSPACE:
                 self.backspace_key_held = False  # Stop tracking the backspace key hold
                 self.backspace_delete_count = 0  # Reset the delete count
-
-    def update(self, delta_time):
-        """Update method to handle auto-repeat functionality."""
-        if self.backspace_key_held:
-            self.backspace_key_timer += delta_time
-            if self.backspace_key_timer >= 0.1:  # Adjust the delay for auto-repeat (in seconds)
-                self.handle_backspace()
-                self.backspace_key_timer = 0  # Reset the timer
+                pygame.time.set_timer(BACKSPACE_REPEAT, 0)  # Stop auto-repeat
+
+    def start_dictation(self):
+        self.editing_field = "description"
+        self.dictation_base = self.description.strip()
+        self.dictation_message = ""
+        self.dictation = Dictation(
+            on_update=lambda dictation: pygame.event.post(pygame.event.Event(DICTATION_UPDATE, dictation=dictation)))
+        self.dictation.start()
+
+    def stop_dictation(self):
+        """Stop listening and ignore anything the dictation thread still reports."""
+        if self.dictation:
+            self.dictation.stop()
+            self.dictation = None
+
+    def start_zoom(self):
+        self.zoom = ZoomView(self.image_path)
+        pygame.event.set_allowed(DRAG_EVENTS)
+
+    def stop_zoom(self):
+        if self.zoom:
+            self.zoom = None
+            pygame.event.set_blocked(DRAG_EVENTS)  # Don't wake the loop for every mouse move
+
+    def handle_dictation(self):
+        text = self.dictation.text
+        if text:
+            self.description = f"{self.dictation_base} {text}".strip()
+        if self.dictation.status == "error":
+            self.dictation_message = str(self.dictation.error)
+            print(self.dictation_message)
+        if self.dictation.status in ("done", "error"):
+            self.dictation = None
 
     def handle_backspace(self):
         """Handle the backspace key to delete characters."""
@@ -277,8 +405,6 @@ class ImageViewer:
                 self.description = self.description[:-1]
         self.backspace_delete_count += 1  # Increment the delete count
 
-        self.show_image()  # Refresh the overlay to reflect the changes
-
     def get_current_field_value(self):
         """Get the current value of the field being edited."""
         if self.editing_field == "date":
@@ -295,12 +421,41 @@ class ImageViewer:
 
     def load_image_metadata(self):
         """Load metadata (date, location, and refresh file name) for the current image."""
+        if self.metadata_loader:  # Use the prefetched metadata when available
+            metadata = self.metadata_loader()
+        else:  # Indexed on disk if we have an index; the city is looked up by request_city, not here
+            metadata = load_metadata(self.image_path, self.index, resolve=False)
         if not self.date:  # Only load EXIF date if no date was parsed from the filename
-            self.date = get_image_date(self.image_path)  # Get the image date
+            self.date = metadata.date  # Get the image date
             self.date_text = self.date.strftime('%Y %m %d') if self.date else ""  # Preload editable date text
         if not self.location_edited:  # Only load geolocated city if not manually edited
-            gps = get_gps_coordinates(self.image_path)  # Get GPS coordinates
-            self.city = reverse_geocode(*gps) if gps else ""  # Reverse geocode the location
+            self.city = metadata.city or ""  # Reverse geocoded location
+            if metadata.city is None and metadata.gps:  # Not geocoded yet: paint now, fill the city in when it arrives
+                self.request_city(metadata)
+
+    def request_city(self, metadata):
+        """Look up the city in the background and post CITY_READY with it, so the overlay updates."""
+        self.city_pending = True
+        if self.city_loader:
+            future = self.city_loader()
+        else:
+            future = geocode_executor.submit(resolve_city, self.image_path, metadata, self.index)
+        image_path = self.image_path
+
+        def post(future):
+            if future.cancelled() or future.exception() is not None:
+                return
+            try:
+                pygame.event.post(pygame.event.Event(CITY_READY, image_path=image_path, city=future.result()))
+            except pygame.error:
+                pass  # The display was closed in the meantime
+        future.add_done_callback(post)
+
+    def find_conflicts(self, final_name):
+        """Return the other files that would get the same name, if this image will be renamed."""
+        if not self.conflict_check or not self.description.strip():  # Blank descriptions aren't renamed
+            return []
+        return self.conflict_check(final_name)
 
     def build_final_filename(self):
         """Build the final filename based on the current state."""
@@ -324,7 +479,8 @@ class ImageViewer:
                 self.change_entry["description"] = self.description.strip()
                 self.change_entry["prefix"] = self.prefix.strip()
                 global_prefix = self.prefix.strip()  # Update the global prefix only when saving changes
-                self.change_entry["city"] = self.city.strip()
+                # A city still being looked up stays None, so a revisit or the end of the session fills it in
+                self.change_entry["city"] = None if self.city_pending and not self.location_edited else self.city.strip()
                 global_location = self.city.strip()  # Update the global location only when saving changes
                 self.change_entry["postfix"] = self.postfix.strip()
                 global_postfix = self.postfix.strip()  # Update the global postfix only when saving changes
@@ -341,36 +497,45 @@ class ImageViewer:
         return self.change_entry
 
     def run(self):
-        pygame.init()
-        self.screen = pygame.display.set_mode((800, 600))
+        owns_display = self.display is None
+        if owns_display:
+            self.display = DisplaySession()
+        self.screen = self.display.screen
+        stats = self.display.stats
         self.show_image()
-        clock = pygame.time.Clock()  # Add a clock to track delta time
-
-        needs_refresh = True  # Track if the screen needs to be refreshed
+        startup.mark("first paint", report=True)
 
         while self.running:
-            delta_time = clock.tick(120) / 1000.0  # Increase frame rate to 120 FPS for better responsiveness
-
-            for event in pygame.event.get():
+            # Sleep until something happens instead of ticking at a fixed frame rate
+            wait_start = time.perf_counter()
+            events = [pygame.event.wait(IDLE_TIMEOUT_MS)]
+            stats.add_wait(time.perf_counter() - wait_start)
+            events += pygame.event.get()  # Handle everything that queued up in one go
+
+            needs_refresh = False  # Only redraw when something visible changed
+            for event in events:
                 if event.type == pygame.QUIT:
                     self.running = False
-                else:
+                elif event.type != pygame.NOEVENT:
                     self.handle_event(event)
-                    needs_refresh = True  # Mark screen for refresh after handling an event
-
-            self.update(delta_time)  # Call the update method for auto-repeat functionality
+                    needs_refresh = needs_refresh or event.type in REDRAW_EVENTS
 
             if self.done:
                 self.handle_current_image()
-                if self.previous_image or self.next_image:
+                if self.previous_image or self.next_image or self.show_grid:
                     break  # Exit the loop to signal navigation to another image
                 needs_refresh = True  # Mark screen for refresh after handling the current image
 
-            if needs_refresh:
+            if needs_refresh and self.running:
+                frame_start = time.perf_counter()
                 self.show_image()  # Refresh the screen only if needed
-                needs_refresh = False  # Reset the refresh flag
+                stats.add_frame(time.perf_counter() - frame_start)
 
-        pygame.quit()
+        pygame.time.set_timer(BACKSPACE_REPEAT, 0)  # Don't let a held Backspace leak into the next image
+        self.stop_dictation()
+        self.stop_zoom()
+        if owns_display:
+            self.display.close()
 
 if __name__ == "__main__":
     image_path = "./photos/sample.jpg"  # Change this to your image file
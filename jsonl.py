@@ -0,0 +1,11 @@
+def truncate_torn_tail(path, valid_end):
+    """Cut a JSON-lines file back to the end of its last complete line, so appends don't land on a torn one.
+
+    valid_end is the byte offset just past the last line that parsed. If that line lost its newline, it gets one.
+    """
+    with open(path, "r+b") as f:
+        f.truncate(valid_end)
+        if valid_end:
+            f.seek(valid_end - 1)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
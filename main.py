@@ -1,58 +1,292 @@
-import pygame
-from image_viewer import ImageViewer
-from renamer import rename_image
+import sys
+from startup import FIRST_PAINT_BUDGET_S, startup
+if "--startup" in sys.argv:  # Checked before argparse, so that every import below is timed
+    startup.enable()
+from dedupe import best_shot, compute_hashes, find_groups
+from metadata_index import MetadataIndex, resolve_city
+from prescan import prescan
+from scanner import ImageMatcher, scan_images
+from changes import ChangeEntry
+from executor import RenameExecutor
+from planner import DELETED_FOLDER, TargetIndex, plan_renames
+from session import SessionLog
+from headless import parse_rule, rename_by_rule
+import geolocator
+from profiler import profiler
+from renamer import apply_fields, rename_image
+from writeback import write_back
+from autocomplete import Autocomplete
 
 from pathlib import Path
 import os
 import argparse
+import cProfile
 import platform
+import threading
 from datetime import datetime  # Add import for current date and time
-import fnmatch  # Add import for wildcard matching
-import re  # Add import for regular expressions
+# The UI modules (image_viewer, display, grid_view, prefetcher) are imported where they're first needed: they
+# pull in pygame, which takes longer to import than everything else together, and --headless, --undo and
+# --help never use it
+startup.mark("imports")
 
 VERSION = "0.1"
+MAX_CONFLICTS_SHOWN = 20  # A rule-based run over a big folder can have thousands
 
 class AutoImageRenamer:
-    def __init__(self, folder_path, test_mode=False, wildcard="*", skip=False):
+    def __init__(self, folder_path, test_mode=False, wildcard="*", skip=False, prescan=False, workers=None,
+                 use_processes=False, sort="name", recursive=False, apply=False, resume=False, dedupe=False,
+                 headless=None, writeback=False, library=()):
         self.folder = Path(folder_path)
         self.test_mode = test_mode
         self.wildcard = wildcard  # Store the wildcard pattern
         self.skip = skip  # Store the skip flag
-        self.changes = []  # List to track changes (original name, proposed new name, delete flag)
-
-        # Build the list of files and initialize changes
-        date_pattern = re.compile(r"^\d{4} \d{2} \d{2}")  # Regex to match "YYYY MM DD"
-        self.images = sorted([
-            f for f in self.folder.iterdir()
-            if f.suffix.lower() in ['.jpg', '.jpeg', '.png']
-            and fnmatch.fnmatch(f.name, self.wildcard)
-            and not (self.skip and date_pattern.match(f.stem))  # Skip files starting with a date if skip is True
-        ])
-        for img in self.images:
-            self.changes.append({"original": img.name, "proposed": img.name, "delete": False, "description": ""})
+        self.prescan = prescan  # Read metadata for the whole folder before the UI opens
+        self.workers = workers  # Pool size for the prescan (None picks one from the CPU count)
+        self.use_processes = use_processes  # Prescan on a process pool instead of threads
+        self.sort = sort  # "name" or "date"
+        self.recursive = recursive  # Also scan subfolders
+        self.apply = apply  # Rename in-process instead of writing a batch file
+        self.resume = resume  # Continue the last session from its autosave log
+        self.dedupe = dedupe  # Review groups of near-duplicate photos before the one-by-one pass
+        self.headless = headless  # Rule ({field: value}) to name every photo by, without opening the viewer
+        self.writeback = writeback  # Store dates, descriptions, prefixes and cities in the files' EXIF/XMP too
+        self.library = library  # Folders of already renamed photos to learn autocomplete suggestions from
+        self.autocomplete = Autocomplete()  # Suggestions for the prefix, location and description fields
+        self.session = SessionLog(self.folder)  # Every committed edit is appended here as it happens
+        if self.resume:
+            self.session.load()
+        self.images = []  # Image paths, filled in by the scanner thread
+        self.changes = []  # ChangeEntry per image (original name, proposed new name, delete flag)
+        self.display = None  # Window shared by every ImageViewer, created when processing starts
+        self.index = MetadataIndex(self.folder)  # Cached EXIF dates, GPS and cities from earlier runs
+        self.targets = TargetIndex([])  # Final name of every file, to flag duplicates while typing
+
+        # Build the list of files and initialize changes in the background, so the first image can be shown
+        # while a large tree is still being enumerated
+        self.scan_condition = threading.Condition()
+        self.scan_done = False
+        self.scanner = threading.Thread(target=self.scan_folder, name="scanner", daemon=True)
+        self.scanner.start()
+
+    def scan_folder(self):
+        matcher = ImageMatcher(self.wildcard, self.skip)
+        try:
+            for image_path in scan_images(self.folder, matcher, self.recursive):
+                folder = image_path.parent.relative_to(self.folder).as_posix()
+                entry = ChangeEntry(image_path.name, "" if folder == "." else folder)
+                self.session.restore(entry)  # Edits from the resumed session, if any
+                with self.scan_condition:
+                    self.images.append(image_path)
+                    self.changes.append(entry)
+                    self.targets.update(len(self.changes) - 1, entry)
+                    self.scan_condition.notify_all()
+        finally:
+            with self.scan_condition:
+                self.scan_done = True
+                self.scan_condition.notify_all()
+
+    def wait_for_images(self, count):
+        """Block until at least count images have been found, or the scan is over. Returns True if they were."""
+        with self.scan_condition:
+            self.scan_condition.wait_for(lambda: len(self.images) >= count or self.scan_done)
+            return len(self.images) >= count
+
+    def wait_for_scan(self):
+        self.wait_for_images(float("inf"))
+
+    def prescan_folder(self):
+        """Fill the index with metadata and cities for every image up front."""
+        self.wait_for_scan()
+        prescan(self.images, self.index, workers=self.workers, use_processes=self.use_processes)
+        start = datetime.now()
+        self.resolve_cities()
+        print(f"Geocoding finished in {(datetime.now() - start).total_seconds():.2f}s")
+
+    def sort_images(self):
+        """Order the images (and their change entries) by EXIF date instead of by name."""
+        if self.sort != "date":
+            return
+        self.wait_for_scan()
+        pairs = sorted(zip(self.images, self.changes), key=lambda pair: (self.index.load(pair[0]).date, pair[0].name))
+        self.images[:] = [image for image, _ in pairs]
+        self.changes[:] = [change for _, change in pairs]
+        self.targets = TargetIndex(self.changes)  # It tracks entries by position, which just changed
+
+    def resolve_cities(self):
+        """Geocode the indexed GPS points that have no city yet, one lookup per grid cell."""
+        pending = {}  # Image path -> indexed metadata record
+        for image_path in list(self.images):  # Whatever has been found so far; the rest is geocoded lazily
+            metadata = self.index.get(image_path)
+            if metadata and metadata.gps and metadata.city is None:
+                pending[image_path] = metadata
+        if not pending:
+            return
+        cities = geolocator.locate_many([metadata.gps for metadata in pending.values()])
+        for image_path, metadata in pending.items():
+            city = cities[metadata.gps]
+            if city is not None:
+                self.index.set_city(image_path, metadata, city)
+
+    def seed_autocomplete(self):
+        """Learn suggestions from renamed files, resumed edits, indexed cities and the library folders."""
+        start = datetime.now()
+        self.wait_for_scan()
+        matched = self.autocomplete.add_filenames(list(self.images))  # sort_images may reorder the list meanwhile
+        for change in list(self.changes):  # Edits restored from a resumed session
+            self.autocomplete.record(change.relative_path, change)
+        for _, _, metadata in list(self.index.rows.values()):
+            if metadata.city:
+                self.autocomplete.add("city", metadata.city)
+        matcher = ImageMatcher("*", False)
+        for folder in self.library:
+            matched += self.autocomplete.add_filenames(scan_images(Path(folder), matcher, True))
+        print(f"Autocomplete learned from {matched} named files in {(datetime.now() - start).total_seconds():.2f}s")
 
     def process_files(self):
         index = 0  # Start with the first image
+        step = 0  # Direction of the last navigation, used to steer prefetching
+        if not self.wait_for_images(1):
+            print(f"No matching images found in {self.folder}")
+            return
+        if self.resume:
+            index = self.restore_position()
+        self.session.open(resume=self.resume)
+        from display import DisplaySession
+        from grid_view import GridView
+        from image_viewer import ImageViewer
+        from prefetcher import Prefetcher
+        self.display = DisplaySession()
+        startup.mark("window open")
+        if self.dedupe and not self.review_duplicates():
+            self.session.close()
+            self.display.close()
+            return
+        prefetcher = Prefetcher(self.images, screen_size=self.display.get_size(), index=self.index)
         while True:
             image_path = self.images[index]
             print(f"\nProcessing file {index + 1}/{len(self.images)}: {image_path.name}")
+            prefetcher.set_screen_size(self.display.get_size())  # Follow window resizes
+            prefetcher.update(index, step)  # Decode and read metadata for the neighbours while we type
 
             # Pass the current file and its change entry to ImageViewer
-            viewer = ImageViewer(image_path, self.changes[index])
+            viewer = ImageViewer(image_path, self.changes[index],
+                                 metadata_loader=lambda path=image_path: prefetcher.take(path),
+                                 city_loader=lambda path=image_path: prefetcher.city(path),
+                                 display=self.display, index=self.index,
+                                 conflict_check=lambda name, i=index: self.find_conflicts(i, name),
+                                 autocomplete=self.autocomplete)
             viewer.run()
 
             # Update the change entry after processing
             self.changes[index] = viewer.get_changes()
+            self.targets.update(index, self.changes[index])
+            self.autocomplete.record(self.changes[index].relative_path, self.changes[index])
+            committed = index
 
             # Handle navigation
             if not viewer.running:  # If ESC was pressed, stop processing
+                self.save_progress(committed, index)
                 break
             elif viewer.next_image:
+                step = 1
+                self.wait_for_images(index + 2)  # The scanner may not have reached the next image yet
                 index = (index + 1) % len(self.images)  # Move to the next image, loop to the start if at the end
             elif viewer.previous_image:
+                step = -1
                 index = (index - 1) % len(self.images)  # Move to the previous image, loop to the end if at the start
+            elif viewer.show_grid:
+                step = 0
+                self.wait_for_scan()  # The grid shows every image
+                grid = GridView(self.display, self.images, self.changes, index=self.index, cursor=index)
+                index = grid.run()
+                for i in grid.modified:  # Bulk edits go to the conflict check and the session log too
+                    self.targets.update(i, self.changes[i])
+                    self.session.record(self.changes[i])
+                    self.autocomplete.record(self.changes[i].relative_path, self.changes[i])
+                if grid.quit:
+                    self.save_progress(committed, index)
+                    break
             else:
+                self.save_progress(committed, index)
                 break  # Exit if neither flag is set
+            self.save_progress(committed, index)
+
+        prefetcher.shutdown()
+        self.fill_pending_cities()
+        self.session.close()
+        self.display.close()
+        print(f"Prefetch stats: {prefetcher.stats()}")
+
+    def fill_pending_cities(self):
+        """Put the cities that were still being geocoded when their image was left into the names."""
+        for i, change in enumerate(self.changes):
+            if "city" in change and change["city"] is None:  # Saved by the viewer while the lookup was running
+                metadata = self.index.load(self.images[i])
+                resolve_city(self.images[i], metadata, self.index)  # Usually in the index by now
+                apply_fields(change, self.images[i], metadata, city=metadata.city or "")
+                self.targets.update(i, change)
+                self.session.record(change)
+
+    def review_duplicates(self):
+        """Show each group of near-identical photos in the grid to pick the keeper. Returns False if the window was closed."""
+        self.wait_for_scan()
+        hashes = compute_hashes(self.images, self.index, workers=self.workers)
+        positions = {image_path: i for i, image_path in enumerate(self.images)}
+        groups = sorted(([positions[image_path] for image_path in sorted(group, key=positions.get)]
+                         for group in find_groups(hashes)), key=lambda group: group[0])
+        from grid_view import GridView
+        print(f"Found {len(groups)} groups of near-duplicates covering {sum(len(group) for group in groups)} photos")
+        for number, group in enumerate(groups, 1):
+            images = [self.images[i] for i in group]
+            grid = GridView(self.display, images, [self.changes[i] for i in group], index=self.index,
+                            cursor=images.index(best_shot(images)), title=f"Duplicates {number}/{len(groups)}",
+                            group=True)
+            grid.run()
+            for i in grid.modified:
+                self.targets.update(group[i], self.changes[group[i]])
+                self.session.record(self.changes[group[i]])
+            if grid.quit:
+                return False
+        return True
+
+    def save_progress(self, committed, index):
+        """Append the edits to image committed, the next position and the global fields to the session log."""
+        import image_viewer
+        self.session.record(self.changes[committed], position=self.changes[index].relative_path, global_values={
+            "prefix": image_viewer.global_prefix,
+            "location": image_viewer.global_location,
+            "postfix": image_viewer.global_postfix,
+        })
+
+    def restore_position(self):
+        """Restore the global fields and return the index of the image the resumed session was on."""
+        import image_viewer
+        image_viewer.global_prefix = self.session.globals.get("prefix", "")
+        image_viewer.global_location = self.session.globals.get("location", "")
+        image_viewer.global_postfix = self.session.globals.get("postfix", "")
+        if self.session.position is None:
+            return 0
+        self.wait_for_scan()
+        for i, change in enumerate(self.changes):
+            if change.relative_path == self.session.position:
+                print(f"Resuming at {change.relative_path} with {len(self.session.saved)} saved edits")
+                return i
+        return 0
+
+    def find_conflicts(self, i, name):
+        """Return the other files that would end up with the same name as image i renamed to name."""
+        change = self.changes[i]
+        return [self.changes[j].relative_path for j in self.targets.others(i, change.folder, name)]
+
+    def plan(self):
+        """Plan every rename and delete-move, printing the conflicts that had to be resolved."""
+        self.wait_for_scan()
+        plan = plan_renames(self.changes, self.folder, require_description=not self.headless)
+        for conflict in plan.conflicts[:MAX_CONFLICTS_SHOWN]:
+            print(f"Conflict: {conflict}")
+        if len(plan.conflicts) > MAX_CONFLICTS_SHOWN:
+            print(f"... and {len(plan.conflicts) - MAX_CONFLICTS_SHOWN} more conflicts, resolved the same way")
+        return plan
 
     def generate_batch_file(self, output_filename="rename_batch"):
         # Detect the operating system
@@ -60,8 +294,12 @@ class AutoImageRenamer:
         batch_file_extension = ".bat" if is_windows else ".sh"
         batch_file_path = self.folder / (output_filename + batch_file_extension)
 
-        deleted_folder = "deleted"  # Use relative path for the deleted folder
+        deleted_folder = DELETED_FOLDER  # Use relative path for the deleted folder
         current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # Get current date and time
+        plan = self.plan()  # Moves in a safe order, with duplicate names already resolved
+
+        def native(path):
+            return path.replace("/", "\\") if is_windows else path
 
         with open(batch_file_path, "w") as batch_file:
             # Add a comment at the top of the batch file
@@ -69,6 +307,8 @@ class AutoImageRenamer:
                 batch_file.write(f":: Generated from image_renamer.py on {current_datetime}\n")
             else:
                 batch_file.write(f"# Generated from image_renamer.py on {current_datetime}\n")
+            for conflict in plan.conflicts:
+                batch_file.write(f"{'::' if is_windows else '#'} Conflict: {conflict}\n")
 
             if is_windows:
                 # Windows commands
@@ -77,29 +317,59 @@ class AutoImageRenamer:
                 # Linux/Mac commands
                 batch_file.write(f"mkdir -p \"{deleted_folder}\"\n")
 
-            for change in self.changes:
-                original = change["original"]
-                proposed = change["proposed"]
-
-                if change["delete"]:
-                    # Move the file to the "deleted" folder
-                    deleted_path = f"{deleted_folder}/{original}" if not is_windows else f"{deleted_folder}\\{original}"
+            created_folders = {deleted_folder}
+            for original, destination in plan.moves:
+                destination_folder = os.path.dirname(destination)
+                if destination.startswith(deleted_folder + "/"):
+                    # Move the file to the "deleted" folder, mirroring its subfolder
+                    if destination_folder not in created_folders:
+                        created_folders.add(destination_folder)
+                        if is_windows:
+                            batch_file.write(f"mkdir \"{native(destination_folder)}\"\n")
+                        else:
+                            batch_file.write(f"mkdir -p \"{destination_folder}\"\n")
                     if is_windows:
-                        batch_file.write(f"move \"{original}\" \"{deleted_path}\"\n")
+                        batch_file.write(f"move \"{native(original)}\" \"{native(destination)}\"\n")
                     else:
-                        batch_file.write(f"mv \"{original}\" \"{deleted_path}\"\n")
-                elif original != proposed and change.get("description", "").strip():
-                    # Rename the file only if the description is not blank
-                    if is_windows:
-                        batch_file.write(f"rename \"{original}\" \"{proposed}\"\n")
+                        batch_file.write(f"mv \"{original}\" \"{destination}\"\n")
+                else:
+                    if is_windows:  # rename takes a bare filename as the new name
+                        batch_file.write(f"rename \"{native(original)}\" \"{os.path.basename(destination)}\"\n")
                     else:
-                        batch_file.write(f"mv \"{original}\" \"{proposed}\"\n")
+                        batch_file.write(f"mv \"{original}\" \"{destination}\"\n")
 
         print(f"Batch file saved to {batch_file_path}")
 
+    def apply_changes(self):
+        """Perform the renames and delete-moves now, journaled so they can be recovered or undone."""
+        RenameExecutor(self.folder).apply(self.plan().moves)
+
     def run(self):
-        self.process_files()
-        self.generate_batch_file()
+        start = datetime.now()
+        if self.prescan or self.headless:
+            self.prescan_folder()
+        else:  # Geocode what the index already knows in the background; the viewer shouldn't wait for it
+            threading.Thread(target=self.resolve_cities, name="geocoder", daemon=True).start()
+        if not self.headless:
+            threading.Thread(target=self.seed_autocomplete, name="autocomplete", daemon=True).start()
+        self.sort_images()
+        if self.headless:
+            rename_by_rule(self.images, self.changes, self.index, self.headless)
+        else:
+            self.process_files()
+        if self.writeback:  # Before renaming, while the images are still at the paths we have
+            self.wait_for_scan()
+            write_back(self.images, self.changes, self.index, workers=self.workers, require_description=not self.headless)
+        if self.apply:
+            self.apply_changes()
+        else:
+            self.generate_batch_file()
+        self.index.close()
+        startup.mark("done", report=True)
+        if self.headless:
+            seconds = (datetime.now() - start).total_seconds()
+            print(f"Processed {len(self.images)} files in {seconds:.2f}s "
+                  f"({len(self.images) / seconds if seconds else 0.0:.1f} files/s)")
 
 
 if __name__ == "__main__":
@@ -107,10 +377,77 @@ if __name__ == "__main__":
     parser.add_argument("folder", help="Path to the folder containing images to rename.")
     parser.add_argument("--wildcard", default="*", help="Optional filename wildcard filter (e.g., 'IMG_*').")
     parser.add_argument("--skip", action="store_true", help="Skip files that already start with a date formatted as 'YYYY MM DD'.")
+    parser.add_argument("--gazetteer", help="GeoNames cities file (e.g. cities1000.txt) or name,lat,lon CSV for offline city lookups.")
+    parser.add_argument("--offline", action="store_true", help="Never fall back to the online Nominatim geocoder.")
+    parser.add_argument("--geocode-cell", type=float, default=geolocator.DEFAULT_CELL_SIZE,
+                        help="Grid size in degrees; photos in the same cell share one city lookup.")
+    parser.add_argument("--prescan", action="store_true", help="Read EXIF and geocode the whole folder before the UI opens.")
+    parser.add_argument("--workers", type=int, help="Number of prescan workers (default depends on the CPU count).")
+    parser.add_argument("--processes", action="store_true", help="Prescan on a process pool instead of threads.")
+    parser.add_argument("--recursive", action="store_true", help="Also process images in subfolders.")
+    parser.add_argument("--sort", choices=["name", "date"], default="name", help="Order images by filename or by EXIF date.")
+    parser.add_argument("--dedupe", action="store_true", help="First review groups of near-duplicate photos, e.g. bursts, and keep the best of each.")
+    parser.add_argument("--headless", metavar="RULE",
+                        help="Name every photo by a rule instead of one by one, e.g. 'date,city,prefix=Holiday'. "
+                             "Fields: date, prefix, city, postfix, description.")
+    parser.add_argument("--writeback", action="store_true",
+                        help="Also store the date, description, prefix and city of every edited photo in its EXIF/XMP metadata.")
+    parser.add_argument("--library", action="append", default=[], metavar="FOLDER",
+                        help="Also learn autocomplete suggestions from photos already named 'YYYY MM DD ...' in this "
+                             "folder and its subfolders. Can be given more than once.")
+    parser.add_argument("--profile", nargs="?", const="image_renamer_profile", metavar="PREFIX",
+                        help="Time scan, metadata, geocode, decode, scale, overlay and flip; print a summary and write "
+                             "PREFIX.json on exit. F12 shows live numbers in the viewer.")
+    parser.add_argument("--cprofile", action="store_true", help="With --profile, also write a cProfile dump to PREFIX.prof.")
+    parser.add_argument("--startup", action="store_true",
+                        help=f"Report startup milestones and the slowest imports once the first image is shown "
+                             f"(budget: {FIRST_PAINT_BUDGET_S:.1f}s).")
+    parser.add_argument("--resume", action="store_true", help="Continue the last session from its autosave log.")
+    parser.add_argument("--apply", action="store_true", help="Rename the files directly (journaled) instead of writing a batch file.")
+    parser.add_argument("--recover", action="store_true", help="Finish an --apply run that was interrupted, then exit.")
+    parser.add_argument("--undo", action="store_true", help="Undo the last --apply run using its journal, then exit.")
     args = parser.parse_args()
 
+    if args.recover or args.undo:
+        executor = RenameExecutor(args.folder)
+        if args.recover:
+            executor.recover()
+        if args.undo:
+            executor.undo()
+        raise SystemExit(0)
+
+    try:
+        rule = parse_rule(args.headless) if args.headless else None
+    except ValueError as e:
+        parser.error(str(e))
+    # Checked now rather than by apply() after the session, so no tagging is lost to an unfinished journal
+    if args.apply and RenameExecutor(args.folder).status() in ("incomplete", "undoing"):
+        parser.error(f"the last --apply run in {args.folder} is unfinished; use --recover or --undo first")
+
+    try:
+        geolocator.configure(gazetteer=args.gazetteer, online=not args.offline, cell_size=args.geocode_cell)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.profile:
+        profiler.enable()  # Before the app starts, so the folder scan is timed too
+
     folder = args.folder
     wildcard = args.wildcard
     skip = args.skip
-    app = AutoImageRenamer(folder_path=folder, test_mode=True, wildcard=wildcard, skip=skip)
-    app.run()
+    app = AutoImageRenamer(folder_path=folder, test_mode=True, wildcard=wildcard, skip=skip, prescan=args.prescan,
+                           workers=args.workers, use_processes=args.processes, sort=args.sort,
+                           recursive=args.recursive, apply=args.apply,
+                           resume=args.resume, dedupe=args.dedupe, headless=rule,
+                           writeback=args.writeback, library=args.library)
+    if args.profile and args.cprofile:
+        cprofile = cProfile.Profile()
+        cprofile.runcall(app.run)
+        cprofile.dump_stats(f"{args.profile}.prof")
+        print(f"cProfile stats saved to {args.profile}.prof")
+    else:
+        app.run()
+    if args.profile:
+        profiler.print_report()
+        profiler.save(f"{args.profile}.json")
+        print(f"Profile saved to {args.profile}.json")
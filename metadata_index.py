@@ -0,0 +1,221 @@
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+import piexif
+from PIL import Image
+from exif_reader import ImageMetadata, get_metadata, read_header, remember_metadata
+from geolocator import CACHE_DIR, locate
+
+INDEX_FILENAME = ".image_renamer.db"
+THUMBNAIL_SIZE = (160, 160)
+COMMIT_EVERY = 200  # Writes are batched into one transaction per this many rows
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    date TEXT,
+    date_from_exif INTEGER,
+    lat REAL,
+    lon REAL,
+    orientation INTEGER,
+    width INTEGER,
+    height INTEGER,
+    city TEXT,
+    thumbnail BLOB,
+    dhash INTEGER
+)
+"""
+# Columns added after the first release, for indexes created before them
+MIGRATIONS = {"dhash": "ALTER TABLE files ADD COLUMN dhash INTEGER"}
+
+
+def default_index_path(folder: Path) -> Path:
+    """Keep the index next to the photos, or in the user cache dir if the folder is read-only."""
+    if os.access(folder, os.W_OK):
+        return folder / INDEX_FILENAME
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha1(str(folder.resolve()).encode()).hexdigest()[:16]
+    return CACHE_DIR / f"{digest}.db"
+
+
+class MetadataIndex:
+    """Persistent per-file metadata (EXIF date, GPS, city, thumbnail), invalidated by size and mtime."""
+
+    def __init__(self, folder, index_path=None):
+        self.folder = Path(folder)
+        self.index_path = Path(index_path) if index_path else default_index_path(self.folder)
+        self.lock = threading.Lock()
+        self.pending_writes = 0
+        self.conn = sqlite3.connect(str(self.index_path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(files)")}
+        for column, statement in MIGRATIONS.items():
+            if column not in columns:
+                self.conn.execute(statement)
+        self.conn.commit()
+
+        # Load every row (minus thumbnails) in one query, so a warm start doesn't touch the images
+        self.rows = {}  # key -> (size, mtime_ns, ImageMetadata)
+        query = "SELECT path, size, mtime_ns, date, date_from_exif, lat, lon, orientation, width, height, city FROM files"
+        for key, size, mtime_ns, date, date_from_exif, lat, lon, orientation, width, height, city in self.conn.execute(query):
+            metadata = ImageMetadata(
+                date=datetime.fromisoformat(date) if date else None,
+                date_from_exif=bool(date_from_exif),
+                gps=(lat, lon) if lat is not None and lon is not None else None,
+                orientation=orientation or 1,
+                width=width or 0,
+                height=height or 0,
+                city=city,
+            )
+            self.rows[key] = (size, mtime_ns, metadata)
+
+    def key(self, image_path):
+        try:
+            return Path(image_path).relative_to(self.folder).as_posix()
+        except ValueError:
+            return str(image_path)
+
+    def get(self, image_path, stat=None):
+        """Return the indexed record if the file hasn't changed since it was indexed, else None."""
+        stat = stat or Path(image_path).stat()
+        row = self.rows.get(self.key(image_path))
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            remember_metadata(image_path, stat, row[2])
+            return row[2]
+        return None
+
+    def put(self, image_path, stat, metadata):
+        key = self.key(image_path)
+        gps = metadata.gps or (None, None)
+        with self.lock:
+            self.rows[key] = (stat.st_size, stat.st_mtime_ns, metadata)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, date, date_from_exif, lat, lon, orientation, "
+                "width, height, city, thumbnail, dhash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, "
+                "(SELECT thumbnail FROM files WHERE path = ? AND size = ? AND mtime_ns = ?), "
+                "(SELECT dhash FROM files WHERE path = ? AND size = ? AND mtime_ns = ?))",
+                (key, stat.st_size, stat.st_mtime_ns, metadata.date.isoformat() if metadata.date else None,
+                 int(metadata.date_from_exif), gps[0], gps[1], metadata.orientation, metadata.width,
+                 metadata.height, metadata.city, key, stat.st_size, stat.st_mtime_ns,
+                 key, stat.st_size, stat.st_mtime_ns))
+            self.written()
+
+    def written(self):
+        """Count a write and commit the batch once it's big enough (call with the lock held)."""
+        self.pending_writes += 1
+        if self.pending_writes >= COMMIT_EVERY:
+            self.conn.commit()
+            self.pending_writes = 0
+
+    def load(self, image_path) -> ImageMetadata:
+        """Return the metadata record for an image, from the index if it's fresh, else from the file."""
+        stat = Path(image_path).stat()
+        metadata = self.get(image_path, stat)
+        if metadata is None:
+            metadata = get_metadata(image_path)
+            self.put(image_path, stat, metadata)
+        return metadata
+
+    def set_city(self, image_path, metadata, city):
+        metadata.city = city
+        with self.lock:
+            self.conn.execute("UPDATE files SET city = ? WHERE path = ?", (city, self.key(image_path)))
+            self.written()
+
+    def get_thumbnail(self, image_path):
+        """Return a small JPEG thumbnail for the image, building and storing it on first use."""
+        stat = Path(image_path).stat()
+        key = self.key(image_path)
+        with self.lock:
+            row = self.conn.execute("SELECT thumbnail FROM files WHERE path = ? AND size = ? AND mtime_ns = ?",
+                                    (key, stat.st_size, stat.st_mtime_ns)).fetchone()
+        if row and row[0]:
+            return row[0]
+        thumbnail = build_thumbnail(image_path)
+        self.load(image_path)  # Make sure the row exists before attaching the thumbnail to it
+        with self.lock:
+            self.conn.execute("UPDATE files SET thumbnail = ? WHERE path = ?", (thumbnail, key))
+            self.written()
+        return thumbnail
+
+    def hashes(self):
+        """Return {key: (size, mtime_ns, hash)} for every file with a stored perceptual hash."""
+        with self.lock:
+            rows = self.conn.execute("SELECT path, size, mtime_ns, dhash FROM files WHERE dhash IS NOT NULL").fetchall()
+        return {key: (size, mtime_ns, dhash & 0xFFFFFFFFFFFFFFFF) for key, size, mtime_ns, dhash in rows}
+
+    def set_hash(self, image_path, stat, value):
+        """Store a 64-bit perceptual hash (SQLite integers are signed, hence the conversion)."""
+        signed = value - (1 << 64) if value >= 1 << 63 else value
+        with self.lock:
+            self.conn.execute("UPDATE files SET dhash = ? WHERE path = ? AND size = ? AND mtime_ns = ?",
+                              (signed, self.key(image_path), stat.st_size, stat.st_mtime_ns))
+            self.written()
+
+    def restat(self, image_path, old_stat, stat, metadata):
+        """Re-key a record after only the file's metadata was rewritten, keeping its city, thumbnail and hash."""
+        previous = self.get(image_path, old_stat)
+        if previous is not None:
+            metadata.city = previous.city
+            with self.lock:
+                self.conn.execute("UPDATE files SET size = ?, mtime_ns = ? WHERE path = ? AND size = ? AND mtime_ns = ?",
+                                  (stat.st_size, stat.st_mtime_ns, self.key(image_path), old_stat.st_size,
+                                   old_stat.st_mtime_ns))
+        self.put(image_path, stat, metadata)
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+
+def build_thumbnail(image_path) -> bytes:
+    """Use the embedded EXIF thumbnail if there is one, else a reduced-scale decode."""
+    try:
+        exif_bytes, _, _ = read_header(image_path)
+        if exif_bytes:
+            thumbnail = piexif.load(exif_bytes).get("thumbnail")
+            if thumbnail:
+                return thumbnail
+    except Exception:
+        pass
+    pil_image = Image.open(image_path)
+    pil_image.draft('RGB', THUMBNAIL_SIZE)
+    pil_image = pil_image.convert('RGB')
+    pil_image.thumbnail(THUMBNAIL_SIZE)
+    buffer = io.BytesIO()
+    pil_image.save(buffer, "JPEG", quality=80)
+    return buffer.getvalue()
+
+
+def load_metadata(image_path, index=None, resolve=True) -> ImageMetadata:
+    """Return the metadata record for an image, using the index if there is one.
+
+    With resolve=True the city is looked up too if it's still unknown, which may mean a network request.
+    """
+    metadata = index.load(image_path) if index else get_metadata(image_path)
+    if resolve and metadata.city is None:
+        resolve_city(image_path, metadata, index)
+    return metadata
+
+
+def resolve_city(image_path, metadata, index=None):
+    """Geocode the record's GPS position into metadata.city (and the index). Returns the city, or None on failure."""
+    if metadata.city is not None:
+        return metadata.city
+    city = locate(*metadata.gps) if metadata.gps else ""
+    if city is None:  # Lookup failed; show no city now but try again next time
+        return None
+    if index:
+        index.set_city(image_path, metadata, city)
+    else:
+        metadata.city = city
+    return city
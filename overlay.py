@@ -0,0 +1,101 @@
+import pygame
+from collections import OrderedDict
+from profiler import profiler
+
+BACKGROUND_COLOR = (30, 30, 30)  # Dark gray behind the image
+OVERLAY_COLOR = (0, 0, 0, 150)  # Black with 150 alpha (translucent)
+LINE_HEIGHT = 36  # Height of each line
+PADDING = 10  # Padding above and below the text
+OVERLAY_X, OVERLAY_Y = 10, 30
+TEXT_X, TEXT_Y = 20, 40
+TEXT_CACHE_SIZE = 256  # Rendered line surfaces kept around, e.g. for the static instruction lines
+
+
+class OverlayRenderer:
+    """Retained-mode drawing of the image and its text overlay.
+
+    The image and the translucent panel are drawn only when the image, the window size or the layout
+    changes. Otherwise only the lines whose text or colour changed are redrawn, over a saved copy of the
+    panel, and just those rectangles are pushed to the display.
+    """
+
+    def __init__(self, font):
+        self.font = font
+        self.text_cache = OrderedDict()  # (text, color) -> rendered surface
+        self.panel_cache = {}  # size -> translucent panel surface
+        self.invalidate()
+
+    def invalidate(self):
+        """Force a full redraw next time, e.g. after something else drew on the screen."""
+        self.image = None
+        self.size = None
+        self.lines = None
+        self.panel_rect = None
+        self.panel_base = None  # Copy of the screen under the panel, with the panel but no text
+        self.drawn = []  # Per line: (text, color, rect) as currently on screen
+
+    def render_text(self, text, color):
+        key = (text, color)
+        surface = self.text_cache.get(key)
+        if surface is None:
+            surface = self.font.render(text, True, color)
+            self.text_cache[key] = surface
+            if len(self.text_cache) > TEXT_CACHE_SIZE:
+                self.text_cache.popitem(last=False)
+        else:
+            self.text_cache.move_to_end(key)
+        return surface
+
+    def panel(self, size):
+        surface = self.panel_cache.get(size)
+        if surface is None:
+            surface = pygame.Surface(size, pygame.SRCALPHA)
+            surface.fill(OVERLAY_COLOR)
+            self.panel_cache = {size: surface}  # Only the current size is worth keeping
+        return surface
+
+    def draw(self, screen, image, lines):
+        """Draw image with lines ([(text, color)], or None for no overlay), updating as little as possible."""
+        with profiler.stage("overlay"):
+            full, dirty = self.render(screen, image, lines)
+        with profiler.stage("flip"):
+            if full:
+                pygame.display.flip()
+            elif dirty:
+                pygame.display.update(dirty)
+
+    def render(self, screen, image, lines):
+        """Draw into the screen surface; returns (full redraw?, dirty rectangles) for pushing to the display."""
+        size = screen.get_size()
+        full = (image is not self.image or size != self.size or (lines is None) != (self.lines is None)
+                or (lines is not None and len(lines) != len(self.lines)))
+        if full:
+            screen.fill(BACKGROUND_COLOR)  # Clear screen with dark gray
+            screen.blit(image, image.get_rect(center=(size[0] // 2, size[1] // 2)))
+            self.image, self.size = image, size
+            if lines is not None:
+                # Calculate overlay height based on the number of lines
+                self.panel_rect = pygame.Rect(OVERLAY_X, OVERLAY_Y, size[0] - 2 * OVERLAY_X,
+                                              len(lines) * LINE_HEIGHT + 2 * PADDING).clip(screen.get_rect())
+                screen.blit(self.panel(self.panel_rect.size), self.panel_rect.topleft)
+                self.panel_base = screen.subsurface(self.panel_rect).copy()
+                self.drawn = [None] * len(lines)
+        self.lines = lines
+
+        dirty = []
+        screen.set_clip(self.panel_rect)  # Long lines are cut off at the panel edge
+        for i, (text, color) in enumerate(lines or []):
+            previous = self.drawn[i]
+            if previous is not None and previous[0] == text and previous[1] == color:
+                continue  # Unchanged line, nothing to do
+            surface = self.render_text(text, color)
+            rect = pygame.Rect(TEXT_X, TEXT_Y + i * LINE_HEIGHT, surface.get_width(), surface.get_height())
+            area = rect.union(previous[2]) if previous is not None else rect
+            area = area.clip(self.panel_rect)
+            if previous is not None:  # Put the panel back under the old text
+                screen.blit(self.panel_base, area.topleft, area.move(-self.panel_rect.x, -self.panel_rect.y))
+            screen.blit(surface, rect.topleft)
+            self.drawn[i] = (text, color, rect)
+            dirty.append(area)
+        screen.set_clip(None)
+        return full, dirty
@@ -0,0 +1,150 @@
+import os
+import posixpath
+from pathlib import Path
+
+DELETED_FOLDER = "deleted"
+TEMP_PREFIX = ".image_renamer_tmp_"
+
+
+def collect_moves(changes, deleted_folder=DELETED_FOLDER, require_description=True):
+    """Turn change entries into (source, destination) pairs relative to the photo folder.
+
+    Interactive sessions only rename files that were given a description; rule-based runs rename everything.
+    """
+    moves = []
+    for change in changes:
+        source = change.relative_path
+        if change["delete"]:
+            moves.append((source, f"{deleted_folder}/{source}"))
+        elif change["original"] != change["proposed"] and (change.get("description", "").strip() or not require_description):
+            # Rename the file only if the description is not blank
+            folder_prefix = change.folder + "/" if change.folder else ""
+            moves.append((source, folder_prefix + change["proposed"]))
+    return moves
+
+
+def path_key(path):
+    """Compare paths case-insensitively, so the plan is also safe on Windows and macOS."""
+    return path.casefold()
+
+
+def with_suffix_number(path, number):
+    """'2025 01 03 Beach.jpg' -> '2025 01 03 Beach 2.jpg'"""
+    stem, ext = posixpath.splitext(path)
+    return f"{stem} {number}{ext}"
+
+
+class RenamePlan:
+    """Ordered, collision-free moves plus a description of every conflict that had to be resolved."""
+
+    def __init__(self):
+        self.moves = []  # (source, destination) in a safe order, including moves through temporary names
+        self.conflicts = []  # Human readable messages
+        self.destinations = {}  # Original source -> final destination after resolving duplicates
+
+
+class TargetIndex:
+    """Hash index of every file's final name, so the viewer can flag duplicates as they're typed."""
+
+    def __init__(self, changes):
+        self.names = [None] * len(changes)  # Change index -> key it's registered under
+        self.claims = {}  # Key -> set of change indices ending up with that name
+        for i, change in enumerate(changes):
+            self.update(i, change)
+
+    def update(self, i, change):
+        old_key = self.names[i] if i < len(self.names) else None
+        if i >= len(self.names):
+            self.names.extend([None] * (i + 1 - len(self.names)))
+        if old_key is not None:
+            self.claims[old_key].discard(i)
+        if change["delete"]:
+            key = None  # Deleted files leave the folder and can't collide
+        elif change["original"] != change["proposed"] and change.get("description", "").strip():
+            key = (change.folder, path_key(change["proposed"]))
+        else:
+            key = (change.folder, path_key(change["original"]))
+        self.names[i] = key
+        if key is not None:
+            self.claims.setdefault(key, set()).add(i)
+
+    def others(self, i, folder, name):
+        """Return the indices of other images that would end up named name in folder."""
+        return sorted(self.claims.get((folder, path_key(name)), set()) - {i})
+
+
+def plan_renames(changes, folder=None, deleted_folder=DELETED_FOLDER, require_description=True):
+    """Build the full rename graph once, resolve duplicate targets and order the moves so none clobbers another.
+
+    Duplicate targets (and targets already taken by files that aren't moving) get a deterministic
+    " 2", " 3", ... suffix in change order. Chains (A->B, B->C) are ordered so C moves first, and cycles
+    (A->B, B->A) are broken by moving one file to a temporary name.
+    """
+    plan = RenamePlan()
+    moves = collect_moves(changes, deleted_folder, require_description)
+    sources = {path_key(source): i for i, (source, _) in enumerate(moves)}
+
+    listed = {}  # Folder -> casefolded names in it, listed at most once per folder
+
+    def occupied(path):
+        """True if a file that isn't being moved away already sits at path."""
+        if folder is None:
+            return False
+        parent = posixpath.dirname(path)
+        if parent not in listed:
+            try:
+                listed[parent] = {path_key(name) for name in os.listdir(Path(folder) / parent)}
+            except OSError:
+                listed[parent] = set()
+        key = path_key(path)
+        return path_key(posixpath.basename(path)) in listed[parent] and key not in sources
+
+    # Give every move a unique destination
+    taken = set()
+    destinations = []
+    for i, (source, destination) in enumerate(moves):
+        resolved = destination
+        number = 2
+        while path_key(resolved) in taken or (occupied(resolved) and path_key(resolved) != path_key(source)):
+            resolved = with_suffix_number(destination, number)
+            number += 1
+        if resolved != destination:
+            plan.conflicts.append(f"{source}: {destination} is already taken, using {resolved}")
+        taken.add(path_key(resolved))
+        destinations.append(resolved)
+        plan.destinations[source] = resolved
+
+    # A move has to wait for the move whose source is its destination. Destinations are unique, so the
+    # graph is made of simple chains and cycles.
+    def blocker(i):
+        j = sources.get(path_key(destinations[i]))
+        return j if j is not None and j != i else None  # A case-only rename doesn't block itself
+
+    emitted = [False] * len(moves)
+    for start in range(len(moves)):
+        if emitted[start]:
+            continue
+        path = []
+        on_path = {}
+        i = start
+        while i is not None and not emitted[i] and i not in on_path:
+            on_path[i] = len(path)
+            path.append(i)
+            i = blocker(i)
+        if i is not None and i in on_path:  # Cycle: path[on_path[i]:] all wait on each other
+            cycle_start = on_path[i]
+            first = path[cycle_start]
+            source = moves[first][0]
+            temp = posixpath.join(posixpath.dirname(source), f"{TEMP_PREFIX}{first}{posixpath.splitext(source)[1]}")
+            plan.conflicts.append(f"{source}: part of a rename cycle, moved through {temp}")
+            plan.moves.append((source, temp))
+            for j in reversed(path[cycle_start + 1:]):
+                plan.moves.append((moves[j][0], destinations[j]))
+                emitted[j] = True
+            plan.moves.append((temp, destinations[first]))
+            emitted[first] = True
+            path = path[:cycle_start]
+        for j in reversed(path):  # The end of a chain moves first
+            plan.moves.append((moves[j][0], destinations[j]))
+            emitted[j] = True
+    return plan
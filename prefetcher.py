@@ -0,0 +1,107 @@
+from concurrent.futures import ThreadPoolExecutor
+from image_cache import image_cache
+from decoder import decode_image
+from metadata_index import load_metadata, resolve_city
+
+
+def cache_image(image_path, screen_size):
+    """Decode and downsample an image into the shared cache, unless it's already there."""
+    if image_cache.get(image_path, screen_size) is None:
+        image_cache.put(image_path, screen_size, decode_image(image_path, screen_size))
+
+
+class Prefetcher:
+    """Decode images and read metadata for the neighbours of the current image in the background."""
+
+    def __init__(self, images, ahead=3, behind=1, workers=2, screen_size=(800, 600), index=None):
+        self.images = images
+        self.index = index  # Optional MetadataIndex, so prefetched metadata is also persisted
+        self.ahead = ahead  # Images to prefetch in the direction of navigation
+        self.behind = behind  # Images to prefetch in the opposite direction
+        self.screen_size = screen_size
+        self.direction = 1  # 1 when moving forward, -1 when moving backward
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        # Geocoding gets its own worker, so a slow lookup never holds up a decode
+        self.geocoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="geocode")
+        self.jobs = {}  # Image path -> future returning the ImageMetadata record, without waiting for its city
+        self.cities = {}  # Image path -> future returning its city (None if the lookup failed)
+        self.hits = 0  # Job already finished when the viewer asked for it
+        self.waits = 0  # Job was still running when the viewer asked for it
+        self.misses = 0  # Job was never scheduled (or was cancelled)
+
+    def job(self, image_path, screen_size):
+        cache_image(image_path, screen_size)
+        return load_metadata(image_path, self.index, resolve=False)
+
+    def city_job(self, image_path):
+        return resolve_city(image_path, load_metadata(image_path, self.index, resolve=False), self.index)
+
+    def schedule(self, image_path):
+        future = self.jobs.get(image_path)
+        if future is None or future.cancelled():
+            self.jobs[image_path] = self.executor.submit(self.job, image_path, self.screen_size)
+        future = self.cities.get(image_path)
+        if future is None or future.cancelled():
+            self.cities[image_path] = self.geocoder.submit(self.city_job, image_path)
+
+    def set_screen_size(self, screen_size):
+        """Drop all queued work if the window size changed, since the decodes would be the wrong size."""
+        screen_size = tuple(screen_size)
+        if screen_size != self.screen_size:
+            self.screen_size = screen_size
+            for future in self.jobs.values():
+                future.cancel()
+            self.jobs = {path: future for path, future in self.jobs.items() if not future.cancelled()}
+
+    def update(self, index, step=0):
+        """Prefetch around index, adapting the direction to the last navigation step."""
+        if step:
+            self.direction = 1 if step > 0 else -1
+        count = len(self.images)
+        wanted = [index]
+        wanted += [(index + self.direction * i) % count for i in range(1, self.ahead + 1)]
+        wanted += [(index - self.direction * i) % count for i in range(1, self.behind + 1)]
+        wanted_paths = [self.images[i] for i in wanted]
+
+        # Cancel queued work that is no longer in the window (running jobs just finish)
+        for jobs in (self.jobs, self.cities):
+            for path in list(jobs):
+                if path not in wanted_paths:
+                    future = jobs[path]
+                    if future.cancel() or future.done():
+                        del jobs[path]
+
+        for path in wanted_paths:
+            self.schedule(path)
+
+    def take(self, image_path):
+        """Return the metadata for an image, waiting for its decode if it's in flight but not for its city."""
+        future = self.jobs.get(image_path)
+        if future is None or future.cancelled():
+            self.misses += 1
+            return load_metadata(image_path, self.index, resolve=False)
+        if future.done():
+            self.hits += 1
+        else:
+            self.waits += 1
+        try:
+            return future.result()
+        except Exception:
+            self.misses += 1
+            return load_metadata(image_path, self.index, resolve=False)
+
+    def city(self, image_path):
+        """Return a future for the image's city, scheduling the lookup if it isn't queued yet."""
+        future = self.cities.get(image_path)
+        if future is None or future.cancelled():
+            future = self.cities[image_path] = self.geocoder.submit(self.city_job, image_path)
+        return future
+
+    def stats(self):
+        return {"hits": self.hits, "waits": self.waits, "misses": self.misses}
+
+    def shutdown(self):
+        for future in list(self.jobs.values()) + list(self.cities.values()):
+            future.cancel()
+        self.executor.shutdown(wait=False)
+        self.geocoder.shutdown(wait=False)
@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from exif_reader import read_metadata
+
+PROGRESS_WIDTH = 30
+
+
+def print_progress(done, total, start, out=sys.stderr):
+    """Draw a one-line progress bar with the current throughput."""
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    filled = PROGRESS_WIDTH * done // max(total, 1)
+    bar = "#" * filled + "." * (PROGRESS_WIDTH - filled)
+    out.write(f"\r[{bar}] {done}/{total} {done / elapsed:.1f} files/s")
+    out.flush()
+
+
+def prescan(images, index, workers=None, use_processes=False, out=sys.stderr):
+    """Read EXIF for every image not already fresh in the index, on a thread or process pool.
+
+    Returns a dictionary with the number of files scanned, already indexed, failed, and the throughput.
+    """
+    workers = workers or min(32, (os.cpu_count() or 1) * (1 if use_processes else 4))
+    start = time.perf_counter()
+    stale = {}  # Image path -> stat taken before reading, so a file changed mid-scan is re-read next time
+    for image_path in images:
+        stat = Path(image_path).stat()
+        if index.get(image_path, stat) is None:
+            stale[image_path] = stat
+
+    cached = len(images) - len(stale)
+    done = cached
+    failed = 0
+    pool = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with pool(max_workers=workers) as executor:
+        futures = {executor.submit(read_metadata, image_path): image_path for image_path in stale}
+        for future in as_completed(futures):
+            image_path = futures[future]
+            try:
+                index.put(image_path, stale[image_path], future.result())
+            except Exception:
+                failed += 1
+            done += 1
+            if done % 25 == 0 or done == len(images):
+                print_progress(done, len(images), start, out)
+    if not stale:
+        print_progress(done, len(images), start, out)
+
+    elapsed = time.perf_counter() - start
+    out.write("\n")
+    stats = {
+        "scanned": len(stale),
+        "cached": cached,
+        "failed": failed,
+        "seconds": elapsed,
+        "files_per_second": len(images) / elapsed if elapsed else 0.0,
+    }
+    out.write(f"Prescan: {stats['scanned']} read, {cached} already indexed, {failed} failed "
+              f"in {elapsed:.2f}s ({stats['files_per_second']:.1f} files/s)\n")
+    return stats
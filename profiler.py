@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+from contextlib import nullcontext
+
+STAGES = ("scan", "metadata", "geocode", "decode", "scale", "overlay", "flip")  # Report order
+BUCKETS = 24  # Power-of-two histogram buckets from 1 µs to about 8 s
+
+
+class StageStats:
+    """Count, total, max and a log2 histogram of one stage's durations, so memory doesn't grow with the session."""
+    __slots__ = ("count", "total", "max", "last", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self.histogram = [0] * BUCKETS  # Bucket i counts durations in [2^(i-1), 2^i) µs
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.histogram[min(BUCKETS - 1, int(seconds * 1e6).bit_length())] += 1
+
+    def percentile(self, fraction):
+        """Upper bound of the histogram bucket holding the given fraction of samples, in seconds."""
+        target = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= target:
+                return min((1 << bucket) / 1e6, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_s": self.total,
+            "mean_ms": 1000 * self.total / self.count if self.count else 0.0,
+            "p50_ms": 1000 * self.percentile(0.5),
+            "p95_ms": 1000 * self.percentile(0.95),
+            "max_ms": 1000 * self.max,
+            "histogram_us": {f"<{1 << bucket}": count for bucket, count in enumerate(self.histogram) if count},
+        }
+
+
+class _Timer:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    """Per-stage timers for the hot paths. Disabled, stage() hands out one shared no-op context manager."""
+
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}  # Stage name -> StageStats
+        self.lock = threading.Lock()  # Decoding and metadata also run on prefetch and prescan threads
+        self.started = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+        self.started = time.perf_counter()
+
+    def stage(self, name):
+        return _Timer(self, name) if self.enabled else _DISABLED
+
+    def add(self, name, seconds):
+        with self.lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats()
+            stats.add(seconds)
+
+    def ordered(self):
+        names = [name for name in STAGES if name in self.stages]
+        return names + sorted(set(self.stages) - set(STAGES))
+
+    def live_line(self):
+        """One line of the latest timings for the overlay, e.g. "decode 41.2ms  overlay 0.3ms  flip 2.1ms"."""
+        with self.lock:
+            return "  ".join(f"{name} {1000 * self.stages[name].last:.1f}ms" for name in self.ordered()
+                             if name not in ("scan", "metadata", "geocode"))
+
+    def report(self):
+        with self.lock:
+            return {
+                "session_s": time.perf_counter() - self.started,
+                "stages": {name: self.stages[name].summary() for name in self.ordered()},
+            }
+
+    def print_report(self):
+        report = self.report()
+        print(f"{'stage':10} {'count':>7} {'total s':>9} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>9}")
+        for name, stats in report["stages"].items():
+            print(f"{name:10} {stats['count']:7} {stats['total_s']:9.3f} {stats['mean_ms']:9.2f} "
+                  f"{stats['p50_ms']:8.2f} {stats['p95_ms']:8.2f} {stats['max_ms']:9.2f}")
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+_DISABLED = nullcontext()
+profiler = Profiler()  # Shared by every module; enabled by main.py's --profile
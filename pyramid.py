@@ -0,0 +1,197 @@
+import math
+from collections import OrderedDict
+import pygame
+from PIL import Image
+from decoder import orient, to_surface
+from exif_reader import get_metadata
+from image_cache import ImageCache
+from overlay import BACKGROUND_COLOR
+from profiler import profiler
+
+TILE_SIZE = 256  # Tile side in screen pixels at every zoom
+TILE_BUDGET_BYTES = 128 * 1024 * 1024  # Tiles kept across images, least recently used dropped first
+LEVEL_BUDGET_BYTES = 256 * 1024 * 1024  # Decoded levels of the current image; one 50 MP level is about 150 MB
+MAX_ZOOM = 2  # Largest zoom is 2 ** MAX_ZOOM (400%); zooming in past 100% magnifies full resolution tiles
+PAN_FRACTION = 0.25  # Arrow keys move the view by this much of the window, Shift + arrow by a whole window
+
+# Same byte-budgeted LRU as the full-screen images, keyed by (path, (zoom, column, row)) instead of window size
+tile_cache = ImageCache(TILE_BUDGET_BYTES)
+
+
+class TilePyramid:
+    """Power-of-two levels of one image, decoded lazily and cut into tiles on demand.
+
+    Level n is the upright image at 1 / 2 ** n of its full size. A level is decoded once (JPEGs at a reduced
+    scale where possible, or reduced from a finer level already in memory) and kept while it fits the level
+    budget; tiles are made from it as they scroll into view and kept in tile_cache.
+    """
+
+    def __init__(self, image_path):
+        self.image_path = image_path
+        metadata = get_metadata(image_path)
+        self.orientation = metadata.orientation
+        width, height = metadata.width, metadata.height
+        if not width or not height:  # Header without dimensions; PIL reads them lazily
+            with Image.open(image_path) as pil_image:
+                width, height = pil_image.size
+        self.size = (height, width) if self.orientation >= 5 else (width, height)  # Upright full size
+        self.levels = OrderedDict()  # Level -> PIL image, least recently used first
+        self.level_bytes = 0
+
+    def level_size(self, level):
+        return tuple(max(1, (side + (1 << level) - 1) >> level) for side in self.size)
+
+    def scaled_size(self, zoom):
+        """Size of the whole image on screen at scale 2 ** zoom."""
+        if zoom >= 0:
+            return (self.size[0] << zoom, self.size[1] << zoom)
+        return self.level_size(-zoom)
+
+    def level_image(self, level):
+        image = self.levels.get(level)
+        if image is not None:
+            self.levels.move_to_end(level)
+            return image
+        size = self.level_size(level)
+        finer = max((n for n in self.levels if n < level), default=None)
+        if finer is not None:  # Reducing a level we already have beats decoding the file again
+            with profiler.stage("scale"):
+                image = self.levels[finer].reduce(1 << (level - finer))  # Box filter, rounds sizes up like level_size
+        else:
+            with profiler.stage("decode"):
+                image = Image.open(self.image_path)
+                if image.format == "JPEG" and level:
+                    image.draft("RGB", (size[1], size[0]) if self.orientation >= 5 else size)
+                image = orient(image.convert("RGB"), self.orientation)
+            if image.size != size:
+                with profiler.stage("scale"):
+                    image = image.resize(size, Image.Resampling.BOX)
+        self.levels[level] = image
+        self.level_bytes += 3 * size[0] * size[1]
+        while self.level_bytes > LEVEL_BUDGET_BYTES and len(self.levels) > 1:
+            _, evicted = self.levels.popitem(last=False)
+            self.level_bytes -= 3 * evicted.width * evicted.height
+        return image
+
+    def tile(self, zoom, column, row):
+        """Return the surface for one tile of the image at scale 2 ** zoom, making it on a cache miss."""
+        key = (zoom, column, row)
+        surface = tile_cache.get(self.image_path, key)
+        if surface is None:
+            image = self.level_image(max(0, -zoom))
+            with profiler.stage("tile"):
+                magnify = 1 << max(0, zoom)
+                span = TILE_SIZE // magnify  # Level pixels covered by one tile
+                box = (column * span, row * span, min((column + 1) * span, image.width),
+                       min((row + 1) * span, image.height))
+                surface = to_surface(image.crop(box))
+                if magnify > 1:  # Hard pixel edges, which is what you want when checking focus
+                    surface = pygame.transform.scale(surface, (surface.get_width() * magnify,
+                                                               surface.get_height() * magnify))
+            tile_cache.put(self.image_path, key, surface)
+        return surface
+
+
+class ZoomView:
+    """Zoom and pan state over a TilePyramid, rendered by blitting only the visible tiles."""
+
+    def __init__(self, image_path):
+        self.pyramid = TilePyramid(image_path)
+        self.center = [side / 2 for side in self.pyramid.size]  # Full resolution pixel in the middle of the window
+        self.zoom = 0  # Scale is 2 ** zoom; starts at 100%, the level for checking focus
+        self.surface = None  # Window-sized frame, reused while the window size stays the same
+        self.changed = True  # The frame needs rendering
+        self.drag = None  # Last mouse position while dragging
+
+    def min_zoom(self, screen_size):
+        """Most zoomed out level: the largest power of two at which the whole image fits in the window."""
+        fit = min(screen_size[0] / self.pyramid.size[0], screen_size[1] / self.pyramid.size[1])
+        return min(0, math.floor(math.log2(fit)))
+
+    def scale(self):
+        return 2.0 ** self.zoom
+
+    def zoom_by(self, step, screen_size, anchor=None):
+        """Zoom in (step > 0) or out, keeping the image point under anchor (window coordinates) in place."""
+        zoom = max(self.min_zoom(screen_size), min(MAX_ZOOM, self.zoom + step))
+        if zoom == self.zoom:
+            return
+        if anchor is not None:
+            old = self.scale()
+            point = [self.center[i] + (anchor[i] - screen_size[i] / 2) / old for i in (0, 1)]
+            ratio = old / 2.0 ** zoom
+            self.center = [point[i] + (self.center[i] - point[i]) * ratio for i in (0, 1)]
+        self.zoom = zoom
+        self.changed = True
+
+    def pan(self, dx, dy):
+        """Move the view by (dx, dy) window pixels."""
+        scale = self.scale()
+        self.center[0] += dx / scale
+        self.center[1] += dy / scale
+        self.changed = True
+
+    def clamp(self, screen_size):
+        """Keep the view on the image, centring it along any axis where it is smaller than the window."""
+        scale = self.scale()
+        for i in (0, 1):
+            half = screen_size[i] / 2 / scale
+            if 2 * half >= self.pyramid.size[i]:
+                self.center[i] = self.pyramid.size[i] / 2
+            else:
+                self.center[i] = max(half, min(self.pyramid.size[i] - half, self.center[i]))
+
+    def render(self, screen_size):
+        """Return (frame, redrawn?): the window-sized view, redrawn only after a zoom, pan or resize."""
+        if self.surface is None or self.surface.get_size() != tuple(screen_size):
+            self.surface = pygame.Surface(screen_size)
+            self.changed = True
+        if not self.changed:
+            return self.surface, False
+        self.zoom = max(self.min_zoom(screen_size), self.zoom)  # The window may have grown
+        self.clamp(screen_size)
+        scale = self.scale()
+        width, height = self.pyramid.scaled_size(self.zoom)
+        left = round(self.center[0] * scale - screen_size[0] / 2)  # View origin in scaled image pixels
+        top = round(self.center[1] * scale - screen_size[1] / 2)
+        self.surface.fill(BACKGROUND_COLOR)
+        first_column, last_column = max(0, left // TILE_SIZE), (min(width, left + screen_size[0]) - 1) // TILE_SIZE
+        first_row, last_row = max(0, top // TILE_SIZE), (min(height, top + screen_size[1]) - 1) // TILE_SIZE
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                tile = self.pyramid.tile(self.zoom, column, row)
+                self.surface.blit(tile, (column * TILE_SIZE - left, row * TILE_SIZE - top))
+        self.changed = False
+        return self.surface, True
+
+    def handle_event(self, event, screen_size):
+        """Zoom with + / - or the mouse wheel, pan with the arrow keys or by dragging. Returns False for other keys."""
+        if event.type == pygame.MOUSEWHEEL and event.y:
+            self.zoom_by(1 if event.y > 0 else -1, screen_size, pygame.mouse.get_pos())
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            self.drag = event.pos
+        elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+            self.drag = None
+        elif event.type == pygame.MOUSEMOTION and self.drag is not None:
+            self.pan(self.drag[0] - event.pos[0], self.drag[1] - event.pos[1])
+            self.drag = event.pos
+        elif event.type == pygame.KEYDOWN:
+            step = screen_size if event.mod & pygame.KMOD_SHIFT else [side * PAN_FRACTION for side in screen_size]
+            if event.unicode in ("+", "=") or event.key == pygame.K_KP_PLUS:
+                self.zoom_by(1, screen_size)
+            elif event.unicode == "-" or event.key == pygame.K_KP_MINUS:
+                self.zoom_by(-1, screen_size)
+            elif event.key == pygame.K_LEFT:
+                self.pan(-step[0], 0)
+            elif event.key == pygame.K_RIGHT:
+                self.pan(step[0], 0)
+            elif event.key == pygame.K_UP:
+                self.pan(0, -step[1])
+            elif event.key == pygame.K_DOWN:
+                self.pan(0, step[1])
+            else:
+                return False
+        return True
+
+    def status(self):
+        return f"Zoom {100 * self.scale():g}%  ({self.pyramid.size[0]}x{self.pyramid.size[1]})"
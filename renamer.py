@@ -1,6 +1,10 @@
 import os
+import re
+from datetime import datetime
 from pathlib import Path
 
+RENAMED_PATTERN = re.compile(r"(\d{4} \d{2} \d{2}) (.+)")  # "YYYY MM DD <description>", as written by build_new_filename
+
 def sanitize_text(text: str) -> str:
     """Sanitize text by removing invalid characters for filenames."""
     invalid_chars = '<>:"/\\|?*'
@@ -18,6 +22,52 @@ def build_new_filename(date, prefix, city, postfix, description, original_ext):
     parts = [part for part in [date_str, prefix_part, city_part, postfix_part, desc_part] if part]  # Include postfix
     return " ".join(parts) + original_ext
 
+def parse_new_filename(stem):
+    """Return (date, description) for a name built by build_new_filename, or None if it doesn't match."""
+    match = RENAMED_PATTERN.match(stem)
+    if not match:
+        return None
+    date_str, description = match.groups()
+    try:  # Same result as strptime(date_str, "%Y %m %d"), several times faster when seeding from a whole library
+        return datetime(int(date_str[:4]), int(date_str[5:7]), int(date_str[8:10])), description.strip()
+    except ValueError:
+        return None
+
+def strip_name_parts(remainder, *parts):
+    """Remove the given parts from the front of a name's remainder, in the order build_new_filename wrote them."""
+    for part in parts:
+        part = sanitize_text(part) if part else ""
+        if part and (remainder == part or remainder.startswith(part + " ")):
+            remainder = remainder[len(part):].strip()
+    return remainder
+
+def apply_fields(change, image_path, metadata, **fields):
+    """Set fields (prefix, description, ...) on a change entry and rebuild its proposed name, like the viewer does."""
+    for field, value in fields.items():
+        change[field] = value
+    if change["delete"]:
+        return
+    parsed = parse_new_filename(Path(image_path).stem)  # Keep what an earlier rename put in the name, like the viewer
+    if parsed and not change.get("date"):
+        change["date"] = parsed[0]
+    if not change.get("date") and metadata:
+        change["date"] = metadata.date
+    if "city" not in change:
+        change["city"] = (metadata.city if metadata else None) or ""
+    if parsed and not change.get("description"):
+        # Leave out the prefix, city and postfix being written now, so renaming twice gives the same name
+        change["description"] = strip_name_parts(
+            parsed[1], change.get("prefix", "") if change.get("use_prefix", True) else "",
+            change["city"] if change.get("include_location", True) else "", change.get("postfix", ""))
+    change["proposed"] = build_new_filename(
+        change.get("date") if change.get("show_date", True) else None,
+        change.get("prefix", "") if change.get("use_prefix", True) else "",
+        change["city"] if change.get("include_location", True) else "",
+        change.get("postfix", ""),
+        change.get("description", ""),
+        Path(image_path).suffix.lower()
+    )
+
 def rename_image(image_path: Path, date, prefix: str, city: str, postfix: str, description: str, test_mode=False):
     """Rename the image file based on the new filename."""
     original_ext = image_path.suffix.lower()
@@ -32,8 +82,6 @@ def rename_image(image_path: Path, date, prefix: str, city: str, postfix: str, d
 
 # For testing
 if __name__ == "__main__":
-    from datetime import datetime
-
     test_path = Path("./photos/IMG_7776.jpg")
     test_date = datetime(2023, 9, 15)  # Example date
     test_prefix = "Vacation"
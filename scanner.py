@@ -0,0 +1,52 @@
+import fnmatch
+import os
+import re
+from pathlib import Path
+from profiler import profiler
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+DATE_PREFIX = re.compile(r"^\d{4} \d{2} \d{2}")  # Regex to match "YYYY MM DD"
+SKIPPED_FOLDERS = {"deleted"}  # Where deleted files are moved, never rescanned
+
+
+class ImageMatcher:
+    """Decides whether a filename should be processed, with the wildcard compiled once up front."""
+
+    def __init__(self, wildcard="*", skip=False):
+        self.match_all = wildcard == "*"
+        self.wildcard = re.compile(fnmatch.translate(os.path.normcase(wildcard)))
+        self.skip = skip  # Skip files that already start with a date
+
+    def __call__(self, name):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            return False
+        if not self.match_all and not self.wildcard.match(os.path.normcase(name)):
+            return False
+        if self.skip and DATE_PREFIX.match(name):
+            return False
+        return True
+
+
+def scan_images(folder, matcher, recursive=False):
+    """Yield matching image paths as they're found, sorted by name within each folder.
+
+    Uses os.scandir so no extra stat calls are needed, and streams results so callers can start on the
+    first image while the rest of the tree is still being enumerated.
+    """
+    pending = [Path(folder)]
+    while pending:
+        current = pending.pop()
+        try:
+            with profiler.stage("scan"), os.scandir(current) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"Skipping {current}: {e}")
+            continue
+        subfolders = []
+        for entry in entries:
+            if entry.is_file() and matcher(entry.name):
+                yield current / entry.name
+            elif recursive and entry.is_dir(follow_symlinks=False) and not entry.name.startswith(".") \
+                    and entry.name not in SKIPPED_FOLDERS:
+                subfolders.append(current / entry.name)
+        pending.extend(reversed(subfolders))  # Visit subfolders in name order, depth first
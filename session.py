@@ -0,0 +1,104 @@
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from jsonl import truncate_torn_tail
+
+SESSION_FILENAME = ".image_renamer_session.jsonl"
+# Change entry fields saved in the log; original and folder identify the entry instead
+SAVED_FIELDS = ("proposed", "delete", "description", "prefix", "city", "postfix", "date",
+                "include_location", "use_prefix", "show_date", "location_edited")
+
+
+def encode(field, value):
+    return value.isoformat() if field == "date" and value is not None else value
+
+
+def decode(field, value):
+    return datetime.fromisoformat(value) if field == "date" and value is not None else value
+
+
+class SessionLog:
+    """Append-only log of committed edits, one small JSON delta per line, so a session can be resumed.
+
+    Lines look like {"file": "IMG_1.jpg", "set": {"description": "Beach"}, "pos": "IMG_2.jpg",
+    "globals": {"prefix": "Trip"}}; every key but "file" is optional and only changed values are written.
+    """
+
+    def __init__(self, folder):
+        self.path = Path(folder) / SESSION_FILENAME
+        self.saved = {}  # Relative path -> {field: value} as last written, to compute deltas
+        self.globals = {}  # Last written global prefix/location/postfix
+        self.position = None  # Relative path of the image to show next
+        self.log = None
+        self.valid_end = None  # Byte offset just past the last line load() could parse
+
+    def load(self):
+        """Replay the log. Returns {relative path: {field: value}} with the latest value of every field."""
+        if not self.path.exists():
+            return {}
+        self.valid_end = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # Torn last line from a crash; everything before it is valid
+                self.valid_end += len(line)
+                if "set" in entry:
+                    fields = self.saved.setdefault(entry["file"], {})
+                    for field, value in entry["set"].items():
+                        fields[field] = decode(field, value)
+                if "pos" in entry:
+                    self.position = entry["pos"]
+                if "globals" in entry:
+                    self.globals.update(entry["globals"])
+        return self.saved
+
+    def open(self, resume=False):
+        """Start writing. A new session keeps the previous log as a .bak file instead of appending to it."""
+        if not resume and self.path.exists():
+            os.replace(self.path, self.path.with_suffix(".bak"))
+            self.saved, self.globals, self.position = {}, {}, None
+        elif resume and self.valid_end is not None and self.path.exists():
+            truncate_torn_tail(self.path, self.valid_end)  # Append after the last complete line, not onto a torn one
+        self.log = open(self.path, "a", encoding="utf-8")
+        if not resume:
+            self.write({"op": "start", "time": time.time()})
+
+    def write(self, entry):
+        self.log.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self.log.flush()  # Survives the app crashing or the window being closed
+
+    def record(self, change, position=None, global_values=None):
+        """Append whatever changed in this entry, the position and the global values since the last record."""
+        key = change.relative_path
+        saved = self.saved.setdefault(key, {})
+        delta = {}
+        for field in SAVED_FIELDS:
+            if field in change and saved.get(field, None) != change[field]:
+                delta[field] = encode(field, change[field])
+                saved[field] = change[field]
+        entry = {"file": key}
+        if delta:
+            entry["set"] = delta
+        if position is not None and position != self.position:
+            entry["pos"] = self.position = position
+        if global_values:
+            changed = {name: value for name, value in global_values.items() if self.globals.get(name) != value}
+            if changed:
+                entry["globals"] = changed
+                self.globals.update(changed)
+        if len(entry) > 1:
+            self.write(entry)
+
+    def restore(self, change):
+        """Apply the saved fields for this entry, if any."""
+        for field, value in self.saved.get(change.relative_path, {}).items():
+            change[field] = value
+
+    def close(self):
+        if self.log:
+            self.log.close()
+            self.log = None
@@ -0,0 +1,85 @@
+import sys
+import time
+from importlib.machinery import ExtensionFileLoader, SourceFileLoader
+
+START = time.perf_counter()  # main.py imports this module first, so this is (almost) when the app started
+FIRST_PAINT_BUDGET_S = 1.0  # The first image should be on screen within this long
+TOP_IMPORTS = 15
+
+
+class ImportTimer:
+    """Meta path hook timing every module loaded from a .py file or an extension, like python -X importtime.
+
+    Only the loader instances of those modules get a timed exec_module, so the modules keep their usual loaders.
+    """
+
+    def __init__(self):
+        self.times = {}  # Module name -> (self seconds, cumulative seconds)
+        self.stack = []  # [name, start, seconds spent in nested imports] of the imports in progress
+        self.total = 0.0  # Seconds spent in outermost imports, so nested ones aren't counted twice
+
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if isinstance(spec.loader, (SourceFileLoader, ExtensionFileLoader)):
+            spec.loader.exec_module = self.timed(name, spec.loader.exec_module)
+        return spec
+
+    def timed(self, name, exec_module):
+        def timed_exec_module(module):
+            self.stack.append([name, time.perf_counter(), 0.0])
+            try:
+                exec_module(module)
+            finally:
+                _, start, nested = self.stack.pop()
+                cumulative = time.perf_counter() - start
+                self.times[name] = (cumulative - nested, cumulative)
+                if self.stack:
+                    self.stack[-1][2] += cumulative
+                else:
+                    self.total += cumulative
+        return timed_exec_module
+
+
+class Startup:
+    """Milestones since launch, plus the slowest imports when timing is enabled."""
+
+    def __init__(self):
+        self.milestones = []  # (name, seconds since START)
+        self.imports = None
+        self.reported = False
+
+    def enable(self):
+        self.imports = ImportTimer()
+        sys.meta_path.insert(0, self.imports)
+
+    def mark(self, name, report=False):
+        """Record a milestone the first time it's reached; with report=True also print the report then."""
+        if not any(milestone == name for milestone, _ in self.milestones):
+            self.milestones.append((name, time.perf_counter() - START))
+        if report:
+            self.report()
+
+    def report(self, out=sys.stderr):
+        if self.imports is None or self.reported:
+            return
+        self.reported = True
+        out.write("Startup:\n")
+        for name, seconds in self.milestones:
+            over = "  OVER BUDGET" if name == "first paint" and seconds > FIRST_PAINT_BUDGET_S else ""
+            out.write(f"  {seconds * 1000:8.1f} ms  {name}{over}\n")
+        times = self.imports.times
+        out.write(f"Imports: {len(times)} modules in {self.imports.total * 1000:.1f} ms. "
+                  f"Slowest (self / cumulative ms):\n")
+        for name, (own, cumulative) in sorted(times.items(), key=lambda item: -item[1][1])[:TOP_IMPORTS]:
+            out.write(f"  {own * 1000:8.1f} {cumulative * 1000:8.1f}  {name}\n")
+        out.flush()
+
+
+startup = Startup()
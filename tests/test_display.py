@@ -0,0 +1,9 @@
+from display import FRAME_SAMPLES, LoopStats
+
+
+def test_frame_times_are_bounded():
+    stats = LoopStats()
+    for _ in range(FRAME_SAMPLES + 500):
+        stats.add_frame(0.001)
+    assert len(stats.frame_times) == FRAME_SAMPLES
+    assert stats.summary().startswith(f"{FRAME_SAMPLES + 500} frames")
@@ -0,0 +1,117 @@
+import json
+
+from executor import JOURNAL_FILENAME, RenameExecutor
+
+
+def make_files(folder, names):
+    for name in names:
+        (folder / name).write_text(name)
+
+
+def test_recover_after_torn_journal_line(tmp_path):
+    make_files(tmp_path, ["a.jpg", "b.jpg", "c.jpg"])
+    executor = RenameExecutor(tmp_path)
+    executor.apply([("a.jpg", "A.jpg"), ("b.jpg", "B.jpg"), ("c.jpg", "C.jpg")])
+
+    # Crash while writing the "done" line of the second move: cut the journal in the middle of that line
+    journal = tmp_path / JOURNAL_FILENAME
+    lines = journal.read_bytes().splitlines(keepends=True)
+    journal.write_bytes(b"".join(lines[:2]) + lines[2][:5])
+    assert executor.status() == "incomplete"
+
+    moved, skipped = executor.recover()
+    assert (moved, skipped) == (2, 0)  # Both moves the journal lost were already made, none is made twice
+    assert executor.status() == "complete"
+    moves, done, _, ops = executor.read_journal()
+    assert done == {0, 1, 2}
+    assert ops.count("commit") == 1
+
+    # The journal is usable again, so the next run starts
+    make_files(tmp_path, ["d.jpg"])
+    assert executor.apply([("d.jpg", "D.jpg")]) == (1, 0)
+    assert (tmp_path / "D.jpg").exists()
+
+
+def test_undo_after_torn_journal_line(tmp_path):
+    make_files(tmp_path, ["a.jpg", "b.jpg"])
+    executor = RenameExecutor(tmp_path)
+    executor.apply([("a.jpg", "A.jpg"), ("b.jpg", "B.jpg")])
+    journal = tmp_path / JOURNAL_FILENAME
+    journal.write_bytes(journal.read_bytes()[:-3])  # Torn "commit" line
+
+    executor.undo()
+    assert executor.status() == "undone"
+    assert sorted(path.name for path in tmp_path.glob("*.jpg")) == ["a.jpg", "b.jpg"]
+
+
+def lose_journal_tail(folder):
+    """Keep only the "begin" line, as if the crash came before the first sync after it."""
+    journal = folder / JOURNAL_FILENAME
+    journal.write_bytes(journal.read_bytes().splitlines(keepends=True)[0])
+
+
+def contents(folder):
+    return {path.name: path.read_text() for path in folder.glob("*.jpg")}
+
+
+def test_recover_and_undo_chain_after_lost_journal_tail(tmp_path):
+    make_files(tmp_path, ["a.jpg", "b.jpg"])
+    executor = RenameExecutor(tmp_path)
+    executor.apply([("b.jpg", "c.jpg"), ("a.jpg", "b.jpg")])  # Planned order: b moves out of the way first
+    lose_journal_tail(tmp_path)
+
+    assert executor.recover() == (2, 0)
+    assert contents(tmp_path) == {"b.jpg": "a.jpg", "c.jpg": "b.jpg"}
+    executor.undo()
+    assert contents(tmp_path) == {"a.jpg": "a.jpg", "b.jpg": "b.jpg"}
+
+
+def test_undo_chain_after_lost_journal_tail(tmp_path):
+    make_files(tmp_path, ["a.jpg", "b.jpg"])
+    executor = RenameExecutor(tmp_path)
+    executor.apply([("b.jpg", "c.jpg"), ("a.jpg", "b.jpg")])
+    lose_journal_tail(tmp_path)
+
+    assert executor.undo() == (2, 0)
+    assert contents(tmp_path) == {"a.jpg": "a.jpg", "b.jpg": "b.jpg"}
+
+
+def test_recover_and_undo_cycle_after_lost_journal_tail(tmp_path):
+    make_files(tmp_path, ["a.jpg", "b.jpg"])
+    executor = RenameExecutor(tmp_path)
+    swap = [("a.jpg", "tmp.jpg"), ("b.jpg", "a.jpg"), ("tmp.jpg", "b.jpg")]
+    executor.apply(swap)
+    lose_journal_tail(tmp_path)
+
+    assert executor.recover() == (3, 0)  # Nothing is moved again, so the swap stays done
+    assert contents(tmp_path) == {"a.jpg": "b.jpg", "b.jpg": "a.jpg"}
+    executor.undo()
+    assert contents(tmp_path) == {"a.jpg": "a.jpg", "b.jpg": "b.jpg"}
+
+
+def test_recover_cycle_interrupted_halfway(tmp_path):
+    make_files(tmp_path, ["a.jpg", "b.jpg"])
+    executor = RenameExecutor(tmp_path)
+    swap = [("a.jpg", "tmp.jpg"), ("b.jpg", "a.jpg"), ("tmp.jpg", "b.jpg")]
+    executor.apply(swap[:2])  # Crash before the last move, with only "begin" in the journal
+    journal = tmp_path / JOURNAL_FILENAME
+    journal.write_text(json.dumps({"op": "begin", "moves": swap}) + "\n", encoding="utf-8")
+
+    assert executor.recover() == (3, 0)
+    assert contents(tmp_path) == {"a.jpg": "b.jpg", "b.jpg": "a.jpg"}
+
+
+def test_resume_undo_of_cycle_after_lost_journal_tail(tmp_path):
+    make_files(tmp_path, ["a.jpg", "b.jpg"])
+    executor = RenameExecutor(tmp_path)
+    swap = [("a.jpg", "tmp.jpg"), ("b.jpg", "a.jpg"), ("tmp.jpg", "b.jpg")]
+    executor.apply(swap)
+    executor.undo()
+    journal = tmp_path / JOURNAL_FILENAME  # Crash after the undo moves, before its "undone" lines were synced
+    lines = journal.read_bytes().splitlines(keepends=True)
+    journal.write_bytes(b"".join(line for line in lines if b'"undone"' not in line and b'"undo_commit"' not in line))
+    assert executor.status() == "undoing"
+
+    executor.undo()  # Resumes without moving anything back a second time
+    assert executor.status() == "undone"
+    assert contents(tmp_path) == {"a.jpg": "a.jpg", "b.jpg": "b.jpg"}
@@ -0,0 +1,26 @@
+import pytest
+
+import geolocator
+
+
+class Fallback:
+    def reverse_geocode(self, lat, lon):
+        return "Fallback City"
+
+
+def test_missing_gazetteer_fails_in_configure(tmp_path):
+    with pytest.raises(ValueError):
+        geolocator.configure(gazetteer=tmp_path / "missing.csv", online=False, cache_path=tmp_path / "cache.json")
+
+
+def test_malformed_gazetteer_falls_through(tmp_path):
+    gazetteer = tmp_path / "cities.csv"
+    gazetteer.write_text("name,lat,lon\nNew York,not a number,-74.0\n", encoding="utf-8")
+    geolocator.configure(gazetteer=gazetteer, online=False, cache_path=tmp_path / "cache.json")
+    offline = geolocator.geocoders[0]
+    assert offline.reverse_geocode(40.7, -74.0) is None
+    assert offline.error is not None
+
+    assert geolocator.locate(40.7, -74.0) is None  # Failed, so not cached either
+    geolocator.geocoders.append(Fallback())
+    assert geolocator.locate(40.7, -74.0) == "Fallback City"
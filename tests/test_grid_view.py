@@ -0,0 +1,27 @@
+from changes import ChangeEntry
+from grid_view import GridView
+
+
+def make_grid(count, **kwargs):
+    changes = [ChangeEntry(f"IMG_{i}.jpg") for i in range(count)]
+    return GridView(None, [f"IMG_{i}.jpg" for i in range(count)], changes, **kwargs), changes
+
+
+def test_keep_without_selection_does_nothing_in_folder_grid():
+    grid, changes = make_grid(4, cursor=1)
+    grid.keep_cursor()
+    assert not any(change["delete"] for change in changes)
+    assert not grid.modified
+
+
+def test_keep_without_selection_deletes_rest_of_duplicate_group():
+    grid, changes = make_grid(3, cursor=1, group=True)
+    grid.keep_cursor()
+    assert [change["delete"] for change in changes] == [True, False, True]
+
+
+def test_keep_with_selection_only_deletes_selection():
+    grid, changes = make_grid(4, cursor=0)
+    grid.selected = {0, 2}
+    grid.keep_cursor()
+    assert [change["delete"] for change in changes] == [False, False, True, False]
@@ -0,0 +1,27 @@
+from datetime import datetime
+from pathlib import Path
+
+from changes import ChangeEntry
+from exif_reader import ImageMetadata
+from headless import apply_rule, parse_rule
+
+
+def rename_once(image_path, rule):
+    change = ChangeEntry(image_path.name)
+    metadata = ImageMetadata(date=datetime(2024, 2, 11), date_from_exif=True, gps=(40.7, -74.0), city="New York")
+    apply_rule(change, image_path, metadata, rule)
+    return image_path.with_name(change["proposed"])
+
+
+def test_rule_twice_gives_the_same_name():
+    rule = parse_rule("date,city,prefix=Holiday")
+    first = rename_once(Path("photos/IMG_0001.jpg"), rule)
+    assert first.name == "2024 02 11 Holiday New York.jpg"
+    assert rename_once(first, rule) == first
+
+
+def test_rule_twice_keeps_the_typed_description():
+    rule = parse_rule("date,city,prefix=Holiday")
+    first = rename_once(Path("photos/2024 02 11 Beach walk.jpg"), rule)
+    assert first.name == "2024 02 11 Holiday New York Beach walk.jpg"
+    assert rename_once(first, rule) == first
@@ -0,0 +1,17 @@
+import os
+
+from main import AutoImageRenamer
+
+
+def test_conflicts_follow_sort_by_date(tmp_path):
+    for age, name in enumerate(["a.jpg", "b.jpg", "c.jpg"]):  # c is the oldest, so sorting by date reverses the names
+        path = tmp_path / name
+        path.write_bytes(b"not a real image")
+        os.utime(path, (1_700_000_000 - 1000 * age, 1_700_000_000 - 1000 * age))
+    app = AutoImageRenamer(tmp_path, sort="date")
+    app.sort_images()
+    assert [change["original"] for change in app.changes] == ["c.jpg", "b.jpg", "a.jpg"]
+
+    assert app.find_conflicts(1, "c.jpg") == ["c.jpg"]
+    assert app.find_conflicts(1, "a.jpg") == ["a.jpg"]
+    app.index.close()
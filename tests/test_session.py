@@ -0,0 +1,32 @@
+from changes import ChangeEntry
+from session import SESSION_FILENAME, SessionLog
+
+
+def resume(folder):
+    session = SessionLog(folder)
+    session.load()
+    session.open(resume=True)
+    return session
+
+
+def test_resume_twice_after_torn_write(tmp_path):
+    session = SessionLog(tmp_path)
+    session.open()
+    first = ChangeEntry("a.jpg")
+    first["description"] = "Beach"
+    session.record(first)
+    session.close()
+    log = tmp_path / SESSION_FILENAME
+    with open(log, "a", encoding="utf-8") as f:
+        f.write('{"file":"b.jpg","se')  # The app died in the middle of a line
+
+    session = resume(tmp_path)
+    second = ChangeEntry("b.jpg")
+    second["description"] = "Sunset"
+    session.record(second)
+    session.close()
+
+    session = resume(tmp_path)  # Everything saved after the crash must still be there
+    session.close()
+    assert session.saved["a.jpg"]["description"] == "Beach"
+    assert session.saved["b.jpg"]["description"] == "Sunset"
@@ -1,33 +1,218 @@
-from vosk import Model, KaldiRecognizer
-import sounddevice as sd
-import queue
 import json
+import queue
+import threading
+import time
+import wave
+from array import array
+
+# vosk and sounddevice are optional and imported on first use, so importing this module costs nothing
+SAMPLE_RATE = 16000
+BLOCK_SIZE = 4000  # Samples per block, a quarter of a second at 16 kHz
+SILENCE_LEVEL = 500  # RMS of 16-bit samples below which a block counts as silence
+SILENCE_SECONDS = 1.5  # Stop after this much silence following speech
+MAX_SECONDS = 30  # Stop after this much audio in any case
+MODEL_LANG = "en-us"  # You must download the model in advance and place it in the expected folder
+
+_model = None
+_model_error = None
+_model_thread = None
+_model_lock = threading.Lock()
+
+
+def _load_model(lang):
+    global _model, _model_error
+    try:
+        from vosk import Model
+        _model = Model(lang=lang)
+    except Exception as e:  # Missing package or model; dictation reports it instead of crashing the viewer
+        _model_error = e
+
+
+def preload_model(lang=MODEL_LANG):
+    """Start loading the speech model on a background thread, once. It stays loaded for the session."""
+    global _model_thread
+    with _model_lock:
+        if _model_thread is None:
+            _model_thread = threading.Thread(target=_load_model, args=(lang,), name="vosk-model", daemon=True)
+            _model_thread.start()
+    return _model_thread
+
+
+def get_model(timeout=None):
+    """Return the loaded model, waiting for the background load. Raises the load error if it failed."""
+    preload_model().join(timeout)
+    if _model_error is not None:
+        raise RuntimeError(f"Voice input unavailable: {_model_error}")
+    if _model is None:
+        raise TimeoutError("Speech model is still loading")
+    return _model
+
+
+def rms(block):
+    """Root mean square of little-endian 16-bit samples."""
+    samples = array("h", block[:len(block) - len(block) % 2])
+    if not samples:
+        return 0.0
+    return (sum(sample * sample for sample in samples) / len(samples)) ** 0.5
+
+
+class MicrophoneSource:
+    """16-bit mono blocks from the default microphone. Each source has its own queue, so nothing leaks between takes."""
+
+    def __init__(self, sample_rate=SAMPLE_RATE, block_size=BLOCK_SIZE):
+        import sounddevice as sd
+        self.sample_rate = sample_rate
+        self.blocks = queue.Queue()
+        self.stream = sd.RawInputStream(samplerate=sample_rate, blocksize=block_size, dtype='int16', channels=1,
+                                        callback=self.callback)
+        self.stream.start()
+
+    def callback(self, indata, frames, time, status):
+        if status:
+            print(status)
+        self.blocks.put(bytes(indata))
+
+    def read(self):
+        try:
+            return self.blocks.get(timeout=1)
+        except queue.Empty:
+            return None  # The device stopped delivering audio
+
+    def close(self):
+        self.stream.stop()
+        self.stream.close()
+
+
+class WavSource:
+    """Blocks from a 16-bit mono WAV file, for testing dictation without a microphone.
+
+    With realtime=True the blocks arrive at the speed they were recorded, like from a microphone.
+    """
+
+    def __init__(self, path, block_size=BLOCK_SIZE, realtime=False):
+        self.wav = wave.open(str(path), "rb")
+        if self.wav.getsampwidth() != 2 or self.wav.getnchannels() != 1:
+            raise ValueError(f"{path}: expected 16-bit mono audio")
+        self.sample_rate = self.wav.getframerate()
+        self.block_size = block_size
+        self.realtime = realtime
+
+    def read(self):
+        block = self.wav.readframes(self.block_size)
+        if not block:
+            return None
+        if self.realtime:
+            time.sleep(len(block) / 2 / self.sample_rate)
+        return block
+
+    def close(self):
+        self.wav.close()
+
+
+class Dictation:
+    """Streaming speech recognition on a background thread.
+
+    text holds the recognized sentences plus the current partial result and is updated as audio comes in;
+    on_update (called from the background thread) lets a UI wake up and redraw. Recognition stops after
+    SILENCE_SECONDS of silence following speech, after MAX_SECONDS of audio, or when stop() is called.
+    Silence is measured in audio time, so a WAV source gives the same result however fast it is read.
+    """
+
+    def __init__(self, source_factory=MicrophoneSource, on_update=None, silence_seconds=SILENCE_SECONDS,
+                 max_seconds=MAX_SECONDS):
+        self.source_factory = source_factory  # Called on the background thread, so opening a device can't block the UI
+        self.on_update = on_update
+        self.silence_seconds = silence_seconds
+        self.max_seconds = max_seconds
+        self.sentences = []  # Final results so far
+        self.partial = ""
+        self.status = "loading"  # loading, listening, done or error
+        self.error = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    @property
+    def text(self):
+        return " ".join(self.sentences + ([self.partial] if self.partial else []))
+
+    def start(self):
+        preload_model()
+        self.thread = threading.Thread(target=self.run, name="dictation", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def wait(self, timeout=None):
+        if self.thread:
+            self.thread.join(timeout)
+        return self.text
+
+    def update(self, status=None):
+        if status:
+            self.status = status
+        if self.on_update:
+            self.on_update(self)
+
+    def run(self):
+        source = None
+        try:
+            model = get_model()
+            from vosk import KaldiRecognizer
+            source = self.source_factory()
+            recognizer = KaldiRecognizer(model, source.sample_rate)
+            self.update("listening")
+            heard = 0.0  # Seconds of audio processed
+            last_voice = None  # Audio time of the last block above the silence level
+            while not self.stopped.is_set():
+                block = source.read()
+                if block is None:
+                    break
+                heard += len(block) / 2 / source.sample_rate
+                if rms(block) >= SILENCE_LEVEL:
+                    last_voice = heard
+                if recognizer.AcceptWaveform(block):
+                    sentence = json.loads(recognizer.Result()).get("text", "")
+                    if sentence:
+                        self.sentences.append(sentence)
+                    self.partial = ""
+                else:
+                    self.partial = json.loads(recognizer.PartialResult()).get("partial", "")
+                self.update()
+                if last_voice is not None and heard - last_voice >= self.silence_seconds:
+                    break
+                if heard >= self.max_seconds:
+                    break
+            sentence = json.loads(recognizer.FinalResult()).get("text", "")  # Final flush
+            if sentence:
+                self.sentences.append(sentence)
+            self.partial = ""
+            self.update("done")
+        except Exception as e:
+            self.error = e
+            self.update("error")
+        finally:
+            if source:
+                source.close()
+
+
+def record_description(source_factory=MicrophoneSource) -> str:
+    """Record until the speaker pauses and return the recognized text."""
+    print("Listening...")
+    text = Dictation(source_factory).start().wait()
+    print("You said:", text)
+    return text
+
 
-model = Model(lang="en-us")  # You must download the model in advance and place it in the expected folder
-q = queue.Queue()
-
-def audio_callback(indata, frames, time, status):
-    if status:
-        print(status)
-    q.put(bytes(indata))
-
-def record_description(duration=5) -> str:
-    recognizer = KaldiRecognizer(model, 16000)
-    with sd.RawInputStream(samplerate=16000, blocksize=8000, dtype='int16',
-                           channels=1, callback=audio_callback):
-        print(f"Recording for {duration} seconds...")
-        result_text = ""
-        for _ in range(int(duration * 16000 / 8000)):
-            data = q.get()
-            if recognizer.AcceptWaveform(data):
-                result = json.loads(recognizer.Result())
-                result_text += result.get("text", "") + " "
-        # Final flush
-        final_result = json.loads(recognizer.FinalResult())
-        result_text += final_result.get("text", "")
-        print("You said:", result_text.strip())
-        return result_text.strip()
-
-# For testing
+# For testing: python voice_input.py [file.wav]
 if __name__ == "__main__":
-    print("Description:", record_description())
\ No newline at end of file
+    import sys
+    if len(sys.argv) > 1:
+        dictation = Dictation(lambda: WavSource(sys.argv[1]), on_update=lambda d: print(f"\r{d.status}: {d.text}", end=""))
+        dictation.start().wait()
+        print()
+        if dictation.error:
+            print(dictation.error)
+    else:
+        print("Description:", record_description())
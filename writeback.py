@@ -0,0 +1,287 @@
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import piexif
+
+from exif_reader import read_metadata
+from prescan import print_progress
+
+EXIF_HEADER = b"Exif\x00\x00"
+XMP_HEADER = b"http://ns.adobe.com/xap/1.0/\x00"
+MAX_SEGMENT = 65533  # Largest APP1 payload; a segment length is 16 bits and includes itself
+TEMP_PREFIX = ".image_renamer_writeback_"
+EXIF_DATE_FORMAT = "%Y:%m:%d %H:%M:%S"
+
+NAMESPACES = {
+    "x": "adobe:ns:meta/",
+    "rdf": "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+    "dc": "http://purl.org/dc/elements/1.1/",
+    "photoshop": "http://ns.adobe.com/photoshop/1.0/",
+}
+for _prefix, _uri in NAMESPACES.items():
+    ET.register_namespace(_prefix, _uri)
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+
+def _tag(name):
+    prefix, local = name.split(":")
+    return f"{{{NAMESPACES[prefix]}}}{local}"
+
+
+class JpegSegments:
+    """The header segments of a JPEG up to the start of scan. Everything from there on is copied byte for byte."""
+
+    def __init__(self, image_path):
+        self.segments = []  # (marker byte, payload) in file order
+        with open(image_path, "rb") as f:
+            if f.read(2) != b"\xff\xd8":
+                raise ValueError("not a JPEG file")
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    raise ValueError("corrupt JPEG header")
+                if marker[1] == 0xDA:  # Start of scan: the compressed pixels follow
+                    self.scan_offset = f.tell() - 2
+                    break
+                length = struct.unpack(">H", f.read(2))[0]
+                self.segments.append((marker[1], f.read(length - 2)))
+
+    def find(self, header):
+        for i, (marker, payload) in enumerate(self.segments):
+            if marker == 0xE1 and payload.startswith(header):
+                return i
+        return None
+
+    def get(self, header):
+        i = self.find(header)
+        return self.segments[i][1] if i is not None else None
+
+    def put(self, header, payload):
+        """Replace the APP1 segment starting with header, or add it after the JFIF/EXIF segments at the top."""
+        if len(payload) > MAX_SEGMENT:
+            raise ValueError("metadata too large for one APP1 segment")
+        i = self.find(header)
+        if i is not None:
+            self.segments[i] = (0xE1, payload)
+            return
+        position = 0
+        while position < len(self.segments) and self.segments[position][0] in (0xE0, 0xE1):
+            position += 1
+        self.segments.insert(position, (0xE1, payload))
+
+    def write(self, image_path, out):
+        out.write(b"\xff\xd8")
+        for marker, payload in self.segments:
+            out.write(bytes((0xFF, marker)) + struct.pack(">H", len(payload) + 2) + payload)
+        with open(image_path, "rb") as f:
+            f.seek(self.scan_offset)
+            shutil.copyfileobj(f, out, 1 << 20)
+
+
+def wanted_fields(change):
+    """The metadata an edited change entry should leave in its file: date, description, prefix and city.
+
+    Fields that are blank or switched off in the viewer are left alone rather than cleared.
+    """
+    fields = {}
+    if change.get("date") and change.get("show_date", True):
+        fields["date"] = change["date"]
+    if change.get("description", "").strip():
+        fields["description"] = change["description"].strip()
+    if change.get("prefix", "").strip() and change.get("use_prefix", True):
+        fields["prefix"] = change["prefix"].strip()
+    if (change.get("city") or "").strip() and change.get("include_location", True):
+        fields["city"] = change["city"].strip()
+    return fields
+
+
+def _description_node(root):
+    """Return the rdf:Description holding our properties, creating the packet structure if needed."""
+    rdf = root.find(_tag("rdf:RDF")) if root.tag != _tag("rdf:RDF") else root
+    if rdf is None:
+        rdf = ET.SubElement(root, _tag("rdf:RDF"))
+    description = rdf.find(_tag("rdf:Description"))
+    if description is None:
+        description = ET.SubElement(rdf, _tag("rdf:Description"), {_tag("rdf:about"): ""})
+    return description
+
+
+def _xmp_root(payload):
+    if payload:
+        try:
+            return ET.fromstring(payload[len(XMP_HEADER):].decode("utf-8").strip(" \0\n"))
+        except (ET.ParseError, UnicodeDecodeError):
+            pass  # Unreadable packet: replaced by a fresh one
+    return ET.Element(_tag("x:xmpmeta"))
+
+
+def _simple(node, name):
+    """Value of a simple property in either the attribute or the element form."""
+    if _tag(name) in node.attrib:
+        return node.attrib[_tag(name)]
+    child = node.find(_tag(name))
+    return child.text if child is not None else None
+
+
+def _set_simple(node, name, value):
+    node.attrib.pop(_tag(name), None)
+    child = node.find(_tag(name))
+    if child is None:
+        child = ET.SubElement(node, _tag(name))
+    child.text = value
+
+
+def _items(node, name):
+    return [item.text or "" for item in node.iterfind(f"{_tag(name)}/*/{_tag('rdf:li')}")]
+
+
+def _set_container(node, name, container, values, attributes=None):
+    for child in node.findall(_tag(name)):
+        node.remove(child)
+    holder = ET.SubElement(ET.SubElement(node, _tag(name)), _tag(container))
+    for value in values:
+        ET.SubElement(holder, _tag("rdf:li"), attributes or {}).text = value
+
+
+def updated_exif(payload, fields):
+    """Return the new EXIF payload, or None if the current one already matches."""
+    exif = piexif.load(payload) if payload else {"0th": {}, "Exif": {}, "GPS": {}, "1st": {}, "thumbnail": None}
+    changed = False
+    if "date" in fields:
+        try:
+            current = datetime.strptime(exif["Exif"][piexif.ExifIFD.DateTimeOriginal].decode(), EXIF_DATE_FORMAT)
+        except (KeyError, ValueError):
+            current = None
+        date = fields["date"]
+        if current is None or current.date() != date.date():
+            if current is not None:
+                date = datetime.combine(date.date(), current.time())  # Only the day was edited; keep the shot time
+            exif["Exif"][piexif.ExifIFD.DateTimeOriginal] = date.strftime(EXIF_DATE_FORMAT).encode()
+            changed = True
+    if "description" in fields:
+        description = fields["description"].encode("utf-8")
+        if exif["0th"].get(piexif.ImageIFD.ImageDescription) != description:
+            exif["0th"][piexif.ImageIFD.ImageDescription] = description
+            changed = True
+    return piexif.dump(exif) if changed else None
+
+
+def updated_xmp(payload, fields):
+    """Return the new XMP payload, or None if the current one already matches."""
+    root = _xmp_root(payload)
+    node = _description_node(root)
+    changed = payload is None
+    if "date" in fields:
+        day = fields["date"].strftime("%Y-%m-%d")
+        current = _simple(node, "photoshop:DateCreated") or ""
+        if current[:10] != day:
+            _set_simple(node, "photoshop:DateCreated", day)
+            changed = True
+    if "city" in fields and _simple(node, "photoshop:City") != fields["city"]:
+        _set_simple(node, "photoshop:City", fields["city"])
+        changed = True
+    if "description" in fields and _items(node, "dc:description") != [fields["description"]]:
+        _set_container(node, "dc:description", "rdf:Alt", [fields["description"]], {XML_LANG: "x-default"})
+        changed = True
+    if "prefix" in fields:
+        keywords = _items(node, "dc:subject")
+        if fields["prefix"] not in keywords:
+            _set_container(node, "dc:subject", "rdf:Bag", keywords + [fields["prefix"]])
+            changed = True
+    if not changed:
+        return None
+    packet = ET.tostring(root, encoding="unicode")
+    return XMP_HEADER + f'<?xpacket begin="\ufeff" id="W5M0MpCehiHzreSzNTczkc9d"?>{packet}<?xpacket end="w"?>'.encode()
+
+
+def write_metadata(image_path, **fields):
+    """Store date, description, prefix and city in the file's EXIF and XMP, without re-encoding the pixels.
+
+    Only the APP1 segments are rebuilt; the image data is copied into a temporary file next to the original,
+    which then replaces it. Returns "written", "up to date" or "unsupported".
+    """
+    image_path = Path(image_path)
+    if image_path.suffix.lower() not in (".jpg", ".jpeg"):
+        return "unsupported"
+    jpeg = JpegSegments(image_path)
+    exif = updated_exif(jpeg.get(EXIF_HEADER), fields) if {"date", "description"} & fields.keys() else None
+    xmp = updated_xmp(jpeg.get(XMP_HEADER), fields) if fields else None
+    if exif is None and xmp is None:
+        return "up to date"
+    if exif is not None:
+        jpeg.put(EXIF_HEADER, exif)
+    if xmp is not None:
+        jpeg.put(XMP_HEADER, xmp)
+
+    handle, temp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, suffix=image_path.suffix, dir=image_path.parent)
+    try:
+        with os.fdopen(handle, "wb") as out:
+            jpeg.write(image_path, out)
+            out.flush()
+            os.fsync(out.fileno())
+        shutil.copystat(image_path, temp_path)  # Keep permissions and the modification time photo apps sort by
+        os.replace(temp_path, image_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return "written"
+
+
+def write_back(images, changes, index=None, workers=None, require_description=True, out=sys.stderr):
+    """Write the metadata of every edited image in one pass on a thread pool.
+
+    Deleted images are skipped, as are images without a description when require_description is set, matching
+    what gets renamed. Returns a dictionary with the number of files written, up to date, unsupported and failed.
+    """
+    workers = workers or min(8, os.cpu_count() or 1)  # Mostly disk-bound copying
+    start = time.perf_counter()
+    jobs = {}  # Image path -> fields to write
+    for image_path, change in zip(images, changes):
+        if change["delete"] or (require_description and not change.get("description", "").strip()):
+            continue
+        fields = wanted_fields(change)
+        if fields:
+            jobs[image_path] = fields
+
+    stats = {"written": 0, "up to date": 0, "unsupported": 0, "failed": 0}
+
+    def write(image_path):
+        stat = Path(image_path).stat()
+        result = write_metadata(image_path, **jobs[image_path])
+        return stat, result, read_metadata(image_path) if result == "written" else None  # Header only, cheap
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(write, image_path): image_path for image_path in jobs}
+        for future in as_completed(futures):
+            image_path = futures[future]
+            try:
+                stat, result, metadata = future.result()
+            except Exception as e:
+                out.write(f"\nWriteback failed for {image_path}: {e}\n")
+                result = "failed"
+            stats[result] += 1
+            if result == "written" and index is not None:
+                index.restat(image_path, stat, Path(image_path).stat(), metadata)
+            done += 1
+            if done % 25 == 0 or done == len(jobs):
+                print_progress(done, len(jobs), start, out)
+
+    elapsed = time.perf_counter() - start
+    if jobs:
+        out.write("\n")
+    stats["seconds"] = elapsed
+    out.write(f"Writeback: {stats['written']} written, {stats['up to date']} already up to date, "
+              f"{stats['unsupported']} unsupported, {stats['failed']} failed in {elapsed:.2f}s\n")
+    return stats